@@ -1,24 +1,138 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
+def interior(c):
+    '''
+    Mask of the points of c inside the main cardioid or the period-2 bulb, which never escape
+    '''
+    x, y = c.real, c.imag
+    q = (x - 0.25)**2 + y**2
+    return (q * (q + x - 0.25) < 0.25 * y**2) | ((x + 1)**2 + y**2 < 0.0625)
+
+def escape_counts(c, max_iter=255, smooth=False, cull=False, periodicity=False):
+    '''
+    The escape time of every point of the flat array c, iterating the points that have not escaped yet all at
+    once. With cull=True, points inside the main cardioid or period-2 bulb are given max_iter without iterating.
+    With periodicity=True, the orbit of each point is compared with its value at the last power-of-two iteration
+    (Brent's cycle detection); an orbit that repeats a value exactly repeats forever, so it stops there with
+    max_iter. Neither changes the counts. Returns the counts and the number of point iterations taken.
+    '''
+    counts = np.full(c.shape, max_iter, dtype=float if smooth else np.int64)
+    index = np.arange(c.size) #flat index of every active point
+    if cull:
+        index = index[~interior(c)]
+    c = c[index]
+    z = np.zeros_like(c)
+    saved = z.copy() #the orbit at the last power-of-two iteration
+    iterations = 0
+    for n in range(1, max_iter + 1):
+        if not len(index):
+            break
+        iterations += len(index)
+        z = z * z + c
+        size = np.abs(z)
+        escaped = size >= 2
+        done = escaped
+        if periodicity:
+            done = escaped | (z == saved)
+            if n & (n - 1) == 0:
+                saved = z.copy()
+        if escaped.any():
+            if smooth:
+                #the continuous count can reach n + 1.53, so it is kept below max_iter, the count of the set
+                counts[index[escaped]] = np.minimum(n + 1 - np.log2(np.log(size[escaped])), max_iter - 1)
+            else:
+                counts[index[escaped]] = n
+        if done.any():
+            #drop the escaped (and cycling) points from the active set
+            active = ~done
+            index, c, z, saved = index[active], c[active], z[active], saved[active]
+    return counts, iterations
+
 class Mandelbrot:
-    def __init__(self, C):
+    def __init__(self, C, max_iter=255):
         self.C = C #an array
+        self.max_iter = max_iter #points that have not escaped after this many iterations are taken to be in the set
 
     def recurse(self):
+        '''
+        The escape time of every point, one pixel at a time; iterate() gives the same counts much faster
+        '''
         Ns = []
         for row in self.C:
             for i in row:
                 z_n = 0
                 n = 0
-                while np.abs(z_n) < 2 and n < 255: 
+                while np.abs(z_n) < 2 and n < self.max_iter: 
                     z_n = (z_n)**2 + i
                     n += 1
                 Ns.append(n) #assigns colour to C
         Ns = np.array(Ns).reshape(self.C.shape)
         return Ns
-    
+
+    def iterate(self, smooth=False, cull=False, periodicity=False):
+        '''
+        The escape time of every point, iterating the whole grid at once. Only the points that have not escaped
+        yet are kept in the active arrays, so escaped points cost nothing. The counts are identical to recurse().
+        With smooth=True, escaped points get the continuous count n + 1 - log2(log|z_n|) instead, which removes
+        the banding between integer counts; it is capped at max_iter - 1, so only points that never escape reach
+        max_iter. cull and periodicity skip points known not to escape, see escape_counts; the number of point
+        iterations taken is kept in self.iterations.
+        '''
+        C = np.asarray(self.C, dtype=complex)
+        Ns, self.iterations = escape_counts(C.ravel(), self.max_iter, smooth, cull, periodicity)
+        return Ns.reshape(C.shape)
+
+    def subdivide(self, min_size=16, cull=True, periodicity=True):
+        '''
+        The integer escape times by rectangle subdivision (the Mariani-Silver algorithm): only the border of a
+        rectangle is iterated, and if every border pixel has the same count the inside is filled with it;
+        otherwise the rectangle is split into four that share its middle row and column. Rectangles of min_size
+        pixels or fewer across are iterated in full; min_size must be at least 2, as the children of a rectangle 2
+        pixels across would be just as wide. As the set is connected, a border entirely in the set always
+        encloses points of the set, but a filament thinner than a pixel spacing can cross a border unseen, so a
+        few pixels may differ from iterate().
+        '''
+        if min_size < 2:
+            raise ValueError(f"min_size must be at least 2, got {min_size}")
+        C = np.asarray(self.C, dtype=complex)
+        height, width = C.shape
+        flat_C = C.ravel()
+        Ns = np.full(C.shape, -1, dtype=np.int64) #-1 until a pixel has been iterated or filled
+        flat = Ns.reshape(-1)
+        self.iterations = 0
+
+        def compute(pixels):
+            #iterate every pixel of a batch, from all the rectangles of a level at once, that is not known yet
+            needed = np.zeros(C.size, dtype=bool)
+            needed[pixels] = True
+            pixels = np.flatnonzero(needed & (flat < 0))
+            flat[pixels], iterations = escape_counts(flat_C[pixels], self.max_iter, False, cull, periodicity)
+            self.iterations += iterations
+
+        index = np.arange(C.size).reshape(C.shape) #flat index of every pixel
+        pending = [(0, height, 0, width)] #rectangles as (first row, last row + 1, first column, last column + 1)
+        while pending:
+            rectangles = [index[r0:r1, c0:c1] for r0, r1, c0, c1 in pending]
+            borders = [np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]]) for pixels in rectangles]
+            compute(np.concatenate(borders))
+            small, split = [], []
+            for (r0, r1, c0, c1), pixels, border in zip(pending, rectangles, borders):
+                values = flat[border]
+                if r1 - r0 <= min_size or c1 - c0 <= min_size:
+                    small.append(pixels.ravel())
+                elif (values == values[0]).all():
+                    Ns[r0 + 1:r1 - 1, c0 + 1:c1 - 1] = values[0] #flood fill the inside
+                else:
+                    rm, cm = (r0 + r1) // 2, (c0 + c1) // 2
+                    split += [(r0, rm + 1, c0, cm + 1), (r0, rm + 1, cm, c1), (rm, r1, c0, cm + 1), (rm, r1, cm, c1)]
+            if small:
+                compute(np.concatenate(small))
+            pending = split
+        return Ns
+
     def run(self, Ns):      
+        import matplotlib.pyplot as plt
+
         plt.imshow(Ns)
         plt.show()
 
@@ -28,7 +142,7 @@ if __name__ == "__main__":
     xv, yv = np.meshgrid(x, y) #generating
     C = xv + 1j*yv
     thing = Mandelbrot(C)
-    cols = thing.recurse()
+    cols = thing.iterate()
     thing.run(cols)
 
 
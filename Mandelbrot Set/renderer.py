@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import argparse
+import numpy as np
+from mandelbrot import Mandelbrot
+
+class TiledRenderer:
+    '''
+    Renders a width x height view of the plane, spanning xlim and ylim, as square tiles of tile_size pixels. The
+    tiles are independent, so they can be computed by any number of processes, in any order.
+    '''
+    def __init__(self, width, height, xlim=(-2.025, 0.6), ylim=(-1.125, 1.125), max_iter=255, smooth=False,
+                 tile_size=256, dtype=None, cull=True, periodicity=False):
+        self.width = width
+        self.height = height
+        self.xlim = xlim
+        self.ylim = ylim
+        self.max_iter = max_iter
+        self.smooth = smooth
+        self.tile_size = tile_size
+        #skip points inside the main cardioid and period-2 bulb, and orbits that cycle; neither changes the counts
+        self.cull = cull
+        self.periodicity = periodicity
+        #counts fit in 16 bits for up to 65535 iterations, which halves or quarters the size of big images
+        if dtype is None:
+            dtype = np.float32 if smooth else (np.uint16 if max_iter < 2**16 else np.int64)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def shape(self):
+        return (self.height, self.width)
+
+    def tiles(self):
+        '''
+        Every tile as (first row, last row + 1, first column, last column + 1)
+        '''
+        return [(r, min(r + self.tile_size, self.height), c, min(c + self.tile_size, self.width))
+                for r in range(0, self.height, self.tile_size) for c in range(0, self.width, self.tile_size)]
+
+    def coordinates(self, tile, step=1):
+        '''
+        The points of the plane at every step-th pixel of a tile, the same values as a meshgrid of the whole view
+        '''
+        r0, r1, c0, c1 = tile
+        x = np.linspace(*self.xlim, self.width)[c0:c1:step]
+        y = np.linspace(*self.ylim, self.height)[r0:r1:step]
+        return x[np.newaxis, :] + 1j*y[:, np.newaxis]
+
+    def render_tile(self, tile):
+        return Mandelbrot(self.coordinates(tile), self.max_iter).iterate(self.smooth, self.cull, self.periodicity)
+
+    def schedule(self, samples=8):
+        '''
+        The tiles in decreasing order of estimated cost, from the counts of a samples x samples preview of each.
+        Tiles on the boundary of the set cost far more than those far outside it, and starting them first keeps
+        every process busy until the end.
+        '''
+        tiles = self.tiles()
+        cost = []
+        for tile in tiles:
+            preview = Mandelbrot(self.coordinates(tile, max(1, self.tile_size // samples)), self.max_iter)
+            preview.iterate(cull=self.cull, periodicity=self.periodicity)
+            cost.append(preview.iterations)
+        return [tiles[i] for i in np.argsort(cost, kind='stable')[::-1]]
+
+    def render(self, processes=None, path=None):
+        '''
+        Render every tile across a pool of processes. Workers take the next most expensive tile as soon as they
+        are free, and write it straight into the output: a shared memory block, or with a path, a .npy file
+        memory-mapped by every process. Returns a RenderedImage whose counts are that output, without copying.
+        '''
+        if path is not None:
+            counts = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=self.shape)
+            counts.flush()
+            block, target = None, ('npy', path, self.shape, self.dtype)
+        else:
+            block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(self.shape)) * self.dtype.itemsize))
+            counts = np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+            target = ('shm', block.name, self.shape, self.dtype)
+
+        try:
+            tiles = self.schedule()
+            if processes == 1:
+                _attach(*target)
+                try:
+                    for tile in tiles:
+                        _render_tile(self, tile)
+                finally:
+                    _detach()
+            else:
+                with ProcessPoolExecutor(max_workers=processes, initializer=_attach, initargs=target) as pool:
+                    # Tiles are handed out one at a time, so a worker that finishes early takes on the remaining ones
+                    for future in [pool.submit(_render_tile, self, tile) for tile in tiles]:
+                        future.result()
+            if path is not None:
+                counts.flush()
+        except BaseException:
+            #a failed tile must not leave the image behind in shared memory
+            counts = None #release the view before closing the block
+            if block is not None:
+                block.close()
+                block.unlink()
+            raise
+        return RenderedImage(counts, block)
+
+class RenderedImage:
+    '''
+    The counts of a render, in shared memory or a memory-mapped file; close() releases them
+    '''
+    def __init__(self, counts, block=None):
+        self.counts = counts
+        self._block = block
+
+    def save_image(self, path, cmap='viridis'):
+        '''
+        Write the counts as an image file, e.g. a .png
+        '''
+        import matplotlib.pyplot as plt
+
+        plt.imsave(path, self.counts, cmap=cmap)
+
+    def close(self):
+        if isinstance(self.counts, np.memmap):
+            self.counts.flush()
+        self.counts = None
+        if self._block is not None:
+            self._block.close()
+            self._block.unlink()
+            self._block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#the output as seen by the process rendering tiles, set up once per worker by _attach
+_target = None
+_target_block = None
+
+def _attach(kind, name, shape, dtype):
+    global _target, _target_block
+    if kind == 'shm':
+        _target_block = shared_memory.SharedMemory(name=name)
+        _target = np.ndarray(shape, dtype=dtype, buffer=_target_block.buf)
+    else:
+        _target = np.load(name, mmap_mode='r+')
+
+def _detach():
+    global _target, _target_block
+    _target = None
+    if _target_block is not None:
+        _target_block.close()
+        _target_block = None
+
+def _render_tile(renderer, tile):
+    '''
+    Worker: render one tile into the output
+    '''
+    r0, r1, c0, c1 = tile
+    _target[r0:r1, c0:c1] = renderer.render_tile(tile)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the Mandelbrot set in tiles across all cores")
+    parser.add_argument('size', type=int, help="width and height of the image in pixels")
+    parser.add_argument('--max-iter', type=int, default=255)
+    parser.add_argument('--tile-size', type=int, default=256)
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes, all cores by default")
+    parser.add_argument('--output', default='mandelbrot.npy', help="memory-mapped .npy file of the counts")
+    parser.add_argument('--image', default=None, help="also save the counts as an image, e.g. mandelbrot.png")
+    args = parser.parse_args()
+
+    renderer = TiledRenderer(args.size, args.size, max_iter=args.max_iter, tile_size=args.tile_size)
+    with renderer.render(args.processes, args.output) as image:
+        if args.image is not None:
+            image.save_image(args.image)
+    print(f"Counts written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from mandelbrot import Mandelbrot, escape_counts
+import numpy as np
+import time
+
+# Views of 512 x 512 pixels: the whole set, one mostly inside the main cardioid, and a zoom onto the boundary
+VIEWS = {'whole set': ((-2.025, 0.6), (-1.125, 1.125)),
+         'interior': ((-1.0, 0.2), (-0.6, 0.6)),
+         'seahorse valley': ((-0.75, -0.73), (0.1, 0.12))}
+SIZE = 512
+
+def grid(xlim, ylim):
+    xv, yv = np.meshgrid(np.linspace(*xlim, SIZE), np.linspace(*ylim, SIZE))
+    return xv + 1j*yv
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def test_smallest_subdivision():
+    # min_size=2 is the smallest that terminates; smaller sizes are refused
+    C = grid((-0.75, -0.73), (0.1, 0.12))[:96, :96]
+    thing = Mandelbrot(C, 255)
+    counts, _ = escape_counts(C.ravel(), 255)
+    assert np.array_equal(thing.subdivide(min_size=2), counts.reshape(C.shape))
+    try:
+        thing.subdivide(min_size=1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("subdivide accepted min_size=1")
+    print("subdivide(min_size=2) matches escape_counts")
+
+def test_smooth_range():
+    # Smooth counts of escaped points stay below max_iter, the count of the points of the set
+    for max_iter in (64, 256):
+        C = grid(*VIEWS['whole set'])
+        counts, _ = escape_counts(C.ravel(), max_iter, smooth=True)
+        inside, _ = escape_counts(C.ravel(), max_iter)
+        assert counts.max() <= max_iter
+        assert np.all(counts[inside < max_iter] < max_iter) and np.all(inside[counts == max_iter] == max_iter)
+    print("smooth counts are at most max_iter")
+
+def main():
+    test_smallest_subdivision()
+    test_smooth_range()
+    for max_iter in (255, 2000):
+        for name, (xlim, ylim) in VIEWS.items():
+            thing = Mandelbrot(grid(xlim, ylim), max_iter)
+            brute_force, brute_force_time = timed(thing.iterate)
+            brute_force_iterations = thing.iterations
+            print(f"{name}, max_iter={max_iter}: brute force {brute_force_time:.2f} s, {brute_force_iterations} iterations")
+            for label, method in [('cardioid and bulb culling', lambda: thing.iterate(cull=True)),
+                                  ('culling and periodicity checks', lambda: thing.iterate(cull=True, periodicity=True)),
+                                  ('Mariani-Silver subdivision', thing.subdivide)]:
+                counts, seconds = timed(method)
+                different = np.count_nonzero(counts != brute_force)
+                print(f"    {label}: {brute_force_time / seconds:.1f}x faster, "
+                      f"{brute_force_iterations / thing.iterations:.1f}x fewer iterations, {different} pixels differ")
+                # Culling and periodicity checks are exact; subdivision can miss filaments thinner than a pixel
+                if method != thing.subdivide:
+                    assert different == 0
+
+if __name__ == "__main__":
+    main()
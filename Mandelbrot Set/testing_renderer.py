@@ -0,0 +1,49 @@
+from mandelbrot import Mandelbrot
+from renderer import TiledRenderer
+import numpy as np
+import os
+import tempfile
+import time
+
+SIZE = 1024
+
+def reference(renderer):
+    '''
+    The whole view iterated in one go, from the same meshgrid as the tiles
+    '''
+    xv, yv = np.meshgrid(np.linspace(*renderer.xlim, renderer.width), np.linspace(*renderer.ylim, renderer.height))
+    return Mandelbrot(xv + 1j*yv, renderer.max_iter).iterate(renderer.smooth)
+
+def test_outputs():
+    '''
+    Shared memory and memory-mapped output, in one process and in a pool, hold exactly the counts of iterate()
+    '''
+    for smooth in (False, True):
+        renderer = TiledRenderer(300, 200, max_iter=200, smooth=smooth, tile_size=64)
+        expected = reference(renderer).astype(renderer.dtype)
+        with tempfile.TemporaryDirectory() as directory:
+            for processes in (1, 2):
+                with renderer.render(processes) as image:
+                    assert np.array_equal(image.counts, expected), ('shared memory', smooth, processes)
+                path = os.path.join(directory, f'counts_{processes}.npy')
+                with renderer.render(processes, path) as image:
+                    assert np.array_equal(image.counts, expected), ('memmap', smooth, processes)
+                assert np.array_equal(np.load(path), expected)
+    print("shared memory and memmap renders match Mandelbrot.iterate")
+
+def main():
+    test_outputs()
+    # Scaling with the number of processes, which can only show a speed-up on a machine with that many cores
+    renderer = TiledRenderer(SIZE, SIZE, max_iter=1000)
+    cores = os.cpu_count() or 1
+    times = {}
+    for processes in range(1, max(2, cores) + 1):
+        start = time.perf_counter()
+        with renderer.render(processes):
+            pass
+        times[processes] = time.perf_counter() - start
+        print(f"{SIZE} x {SIZE}, max_iter=1000, {processes} processes: {times[processes]:.2f} s, "
+              f"{times[1] / times[processes]:.2f}x the speed of one process ({cores} cores available)")
+
+if __name__ == '__main__':
+    main()
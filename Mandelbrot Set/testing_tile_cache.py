@@ -0,0 +1,40 @@
+from mandelbrot import Mandelbrot
+from tile_cache import TileCache, TilePyramid
+import numpy as np
+import tempfile
+import time
+
+WIDTH, HEIGHT = 800, 600
+
+def direct(pyramid, center, zoom):
+    '''
+    The same view computed from scratch, without tiles
+    '''
+    size = pyramid.pixel_size(zoom)
+    left = int(np.floor((center.real - pyramid.origin[0]) / size - WIDTH / 2))
+    bottom = int(np.floor((center.imag - pyramid.origin[1]) / size - HEIGHT / 2))
+    return Mandelbrot(pyramid.coordinates(zoom, np.arange(left, left + WIDTH), np.arange(bottom, bottom + HEIGHT))).iterate()
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        pyramid = TilePyramid(TileCache(directory=directory))
+        center = -0.745 + 0.11j
+        pan = 5 * pyramid.pixel_size(6)
+        # A first view, a pan by a few pixels, a zoom in, and back out to the first view
+        for label, view, zoom in [('first view', center, 6), ('pan by 5 pixels', center + pan, 6),
+                                  ('zoom in', center, 7), ('zoom back out', center, 6)]:
+            misses = pyramid.cache.misses
+            start = time.perf_counter()
+            Ns, extent = pyramid.render(view, zoom, WIDTH, HEIGHT)
+            print(f"{label}: {time.perf_counter() - start:.3f} s, {pyramid.cache.misses - misses} tiles computed")
+            assert np.array_equal(Ns, direct(pyramid, view, zoom))
+
+        # A new session finds the tiles on disk
+        pyramid = TilePyramid(TileCache(directory=directory))
+        start = time.perf_counter()
+        pyramid.render(center, 7, WIDTH, HEIGHT)
+        print(f"zoom in, new session: {time.perf_counter() - start:.3f} s, {pyramid.cache.disk_hits} tiles loaded from disk, "
+              f"{pyramid.cache.misses} computed")
+
+if __name__ == "__main__":
+    main()
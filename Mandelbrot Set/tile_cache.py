@@ -0,0 +1,177 @@
+from collections import OrderedDict
+import json
+import os
+import numpy as np
+from mandelbrot import escape_counts
+
+class TileCache:
+    '''
+    Least recently used cache of iteration-count tiles keyed by (zoom, tile x, tile y, max_iter), holding at most
+    max_bytes of tiles in memory. With a directory, every computed tile is also saved there compressed, and tiles
+    evicted from memory (or computed by an earlier session) are loaded back from it instead of being recomputed.
+    '''
+    def __init__(self, max_bytes=256 * 2**20, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.tiles = OrderedDict() #oldest first
+        self.nbytes = 0
+        self.hits = 0 #found in memory
+        self.disk_hits = 0 #loaded from the directory
+        self.misses = 0 #not found anywhere, so computed
+
+    def _path(self, key):
+        zoom, x, y, max_iter = key
+        return os.path.join(self.directory, f'{max_iter}', f'{zoom}', f'{x}_{y}.npz')
+
+    def get(self, key):
+        '''
+        The tile of key, or None if it has to be computed
+        '''
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            self.hits += 1
+            return self.tiles[key]
+        if self.directory is not None and os.path.exists(self._path(key)):
+            with np.load(self._path(key)) as saved:
+                tile = saved['counts']
+            self.disk_hits += 1
+            self._keep(key, tile)
+            return tile
+        self.misses += 1
+        return None
+
+    def put(self, key, tile):
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.savez_compressed(path, counts=tile)
+        self._keep(key, tile)
+
+    def _keep(self, key, tile):
+        self.tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self.tiles) > 1:
+            key, evicted = self.tiles.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+class TilePyramid:
+    '''
+    The plane as a pyramid of square tiles of tile_size pixels. At zoom level 0 a single tile covers the square of
+    side `side` whose lower left corner is `origin`; every level up halves the pixel spacing, so level z has 2**z
+    tiles across that square (and any tiles outside it). A view is composed from the tiles it overlaps, and only the
+    tiles missing from the cache are computed, so panning or zooming back to a view seen before is cheap.
+    '''
+    def __init__(self, cache=None, origin=(-2.025, -1.3125), side=2.625, tile_size=256):
+        self.cache = cache if cache is not None else TileCache()
+        self.origin = origin
+        self.side = side
+        self.tile_size = tile_size
+        if self.cache.directory is not None:
+            self._check_directory()
+
+    def _check_directory(self):
+        #tiles on disk are only valid for the layout they were computed with
+        layout = {'origin': list(self.origin), 'side': self.side, 'tile_size': self.tile_size}
+        path = os.path.join(self.cache.directory, 'pyramid.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved != layout:
+                raise ValueError(f"The tiles in {self.cache.directory} were computed for a different pyramid: {saved}")
+        else:
+            os.makedirs(self.cache.directory, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(layout, f)
+
+    def pixel_size(self, zoom):
+        return self.side / (2**zoom * self.tile_size)
+
+    def coordinates(self, zoom, columns, rows):
+        '''
+        The points of the plane at global pixel columns and rows of a zoom level, as a (rows, columns) grid
+        '''
+        size = self.pixel_size(zoom)
+        x = self.origin[0] + np.asarray(columns) * size
+        y = self.origin[1] + np.asarray(rows) * size
+        return x[np.newaxis, :] + 1j*y[:, np.newaxis]
+
+    def tile_coordinates(self, zoom, x, y):
+        pixels = np.arange(self.tile_size)
+        return self.coordinates(zoom, x * self.tile_size + pixels, y * self.tile_size + pixels)
+
+    def tiles(self, keys):
+        '''
+        The tiles of keys (zoom, tile x, tile y, max_iter), from the cache where possible. The missing tiles are
+        computed together, grouped by max_iter, in one vectorized call.
+        '''
+        found = {key: self.cache.get(key) for key in keys}
+        missing = [key for key, tile in found.items() if tile is None]
+        for max_iter in {key[3] for key in missing}:
+            batch = [key for key in missing if key[3] == max_iter]
+            C = np.stack([self.tile_coordinates(zoom, x, y) for zoom, x, y, _ in batch])
+            counts, _ = escape_counts(C.ravel(), max_iter, cull=True)
+            dtype = np.uint16 if max_iter < 2**16 else np.int64
+            for key, tile in zip(batch, counts.reshape(C.shape).astype(dtype)):
+                self.cache.put(key, tile)
+                found[key] = tile
+        return found
+
+    def render(self, center, zoom, width, height, max_iter=255):
+        '''
+        The iteration counts of a width x height view centred on the complex number center at a zoom level, and its
+        extent (xmin, xmax, ymin, ymax) for imshow. Rows go up in the imaginary part.
+        '''
+        size = self.pixel_size(zoom)
+        #the view is aligned to the pixels of the level, so it can be cut out of its tiles
+        left = int(np.floor((center.real - self.origin[0]) / size - width / 2))
+        bottom = int(np.floor((center.imag - self.origin[1]) / size - height / 2))
+        T = self.tile_size
+        keys = [(zoom, x, y, max_iter) for y in range(bottom // T, (bottom + height - 1) // T + 1)
+                for x in range(left // T, (left + width - 1) // T + 1)]
+        tiles = self.tiles(keys)
+        Ns = np.empty((height, width), dtype=next(iter(tiles.values())).dtype)
+        for (_, x, y, _), tile in tiles.items():
+            #the overlap of the tile with the view, in global pixels
+            c0, c1 = max(left, x * T), min(left + width, (x + 1) * T)
+            r0, r1 = max(bottom, y * T), min(bottom + height, (y + 1) * T)
+            Ns[r0 - bottom:r1 - bottom, c0 - left:c1 - left] = tile[r0 - y * T:r1 - y * T, c0 - x * T:c1 - x * T]
+        extent = (self.origin[0] + left * size, self.origin[0] + (left + width) * size,
+                  self.origin[1] + bottom * size, self.origin[1] + (bottom + height) * size)
+        return Ns, extent
+
+def explore(pyramid=None, center=-0.6+0j, zoom=1, width=800, height=600, max_iter=255):
+    '''
+    Interactive viewer: the arrow keys pan by a quarter of the view and + and - zoom in and out, each redrawing
+    from the tile pyramid
+    '''
+    import matplotlib.pyplot as plt
+
+    pyramid = pyramid if pyramid is not None else TilePyramid()
+    fig, ax = plt.subplots()
+    Ns, extent = pyramid.render(center, zoom, width, height, max_iter)
+    image = ax.imshow(Ns, origin='lower', extent=extent)
+    view = {'center': center, 'zoom': zoom}
+
+    def on_key(event):
+        step = pyramid.pixel_size(view['zoom']) * width / 4
+        moves = {'left': -step, 'right': step, 'up': step * 1j, 'down': -step * 1j}
+        if event.key in moves:
+            view['center'] += moves[event.key]
+        elif event.key in ('+', '='):
+            view['zoom'] += 1
+        elif event.key == '-':
+            view['zoom'] -= 1
+        else:
+            return
+        Ns, extent = pyramid.render(view['center'], view['zoom'], width, height, max_iter)
+        image.set_data(Ns)
+        image.set_extent(extent)
+        ax.set_xlim(extent[:2])
+        ax.set_ylim(extent[2:])
+        fig.canvas.draw_idle()
+
+    fig.canvas.mpl_connect('key_press_event', on_key)
+    plt.show()
+
+if __name__ == "__main__":
+    explore()
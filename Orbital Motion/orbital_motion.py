@@ -1,6 +1,18 @@
+from functools import lru_cache
+from importlib.util import find_spec
+import warnings
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+
+#numba is optional; without it OrbitalMotion(engine='numba') falls back to the vectorized engine
+NUMBA_AVAILABLE = find_spec('numba') is not None
+
+@lru_cache(maxsize=None)
+def _compiled(function):
+    '''
+    function compiled by numba, which is only imported the first time it is needed
+    '''
+    import numba
+    return numba.njit(cache=True)(function)
 
 class CelestialBody:
     def __init__(self, name, mass, position, velocity):
@@ -9,96 +21,318 @@ class CelestialBody:
         self.position = np.array(position, dtype=float) 
         self.velocity = np.array(velocity, dtype=float)
 
+def accelerations(position, mass, G):
+    '''
+    Gravitational acceleration of every body due to all the others, from (N, 2) positions in one vectorized call
+    '''
+    r = position[np.newaxis, :, :] - position[:, np.newaxis, :] #r[i, j] is the displacement from body i to body j
+    distance_cubed = np.sum(r**2, axis=-1)**1.5
+    np.fill_diagonal(distance_cubed, np.inf) #a body exerts no force on itself
+    return G * np.einsum('ijk,ij->ik', r, mass / distance_cubed)
+
+def _euler_block(position, velocity, mass, G, dt, first, num_steps, stride, records, kinetic):
+    '''
+    Take num_steps euler steps in place, in one loop compiled with _compiled, writing the positions and kinetic energy of every
+    step that falls on the recording stride into records and kinetic. Each pair of bodies is visited once.
+    '''
+    n = len(mass)
+    a = np.empty((n, 2))
+    sample = 0
+    for step in range(first + 1, first + num_steps + 1):
+        a[:] = 0.0
+        for i in range(n):
+            for j in range(i + 1, n):
+                dx = position[j, 0] - position[i, 0]
+                dy = position[j, 1] - position[i, 1]
+                scale = G / (dx * dx + dy * dy)**1.5
+                a[i, 0] += scale * mass[j] * dx
+                a[i, 1] += scale * mass[j] * dy
+                a[j, 0] -= scale * mass[i] * dx
+                a[j, 1] -= scale * mass[i] * dy
+        for i in range(n):
+            for k in range(2):
+                velocity[i, k] += a[i, k] * dt
+                position[i, k] += velocity[i, k] * dt
+        if step % stride == 0:
+            records[sample] = position
+            kinetic[sample] = 0.5 * np.sum(mass * np.sum(velocity**2, axis=1))
+            sample += 1
+
+def solve_kepler(mean_anomaly, eccentricity, tol=1e-12, max_iter=50):
+    '''
+    Solve Kepler's equation for the eccentric anomaly E at every mean anomaly M at once, with Newton iteration:
+    E - e sin(E) = M for elliptical orbits (e < 1), or e sinh(E) - E = M (the hyperbolic anomaly) for e > 1
+    '''
+    M = np.asarray(mean_anomaly, dtype=float)
+    e = eccentricity
+    if e < 1:
+        M = np.mod(M + np.pi, 2 * np.pi) - np.pi #the same orbit position, but newton converges from [-pi, pi)
+        E = M + e * np.sin(M) if e < 0.8 else np.pi * np.sign(M) #starting guess
+        f, df = lambda E: E - e * np.sin(E) - M, lambda E: 1 - e * np.cos(E)
+    else:
+        E = np.arcsinh(M / e)
+        f, df = lambda E: e * np.sinh(E) - E - M, lambda E: e * np.cosh(E) - 1
+    for _ in range(max_iter):
+        step = f(E) / df(E)
+        E = E - step
+        if np.all(np.abs(step) < tol):
+            break
+    return E
+
+class KeplerOrbit:
+    '''
+    The exact motion of an isolated pair of bodies. Their relative state is converted to orbital elements once,
+    then the positions and velocities at any array of times are found in one vectorized call, at a cost per sample
+    that does not depend on how far apart the times are, and without energy drift.
+    '''
+    def __init__(self, primary, secondary, G):
+        self.bodies = [primary, secondary]
+        total_mass = primary.mass + secondary.mass
+        self.mu = G * total_mass #gravitational parameter of the relative orbit
+        self.fractions = np.array([-secondary.mass, primary.mass]) / total_mass #each body's share of the separation
+        #the barycentre moves in a straight line
+        self.barycentre = (primary.mass * primary.position + secondary.mass * secondary.position) / total_mass
+        self.barycentre_velocity = (primary.mass * primary.velocity + secondary.mass * secondary.velocity) / total_mass
+
+        #orbital elements of the secondary relative to the primary
+        r = secondary.position - primary.position
+        v = secondary.velocity - primary.velocity
+        distance = np.linalg.norm(r)
+        h = r[0] * v[1] - r[1] * v[0] #specific angular momentum, positive for an anticlockwise orbit
+        if h == 0:
+            raise ValueError("The bodies move along a straight line, which has no orbit")
+        energy = 0.5 * v @ v - self.mu / distance
+        if energy == 0:
+            raise ValueError("Parabolic orbits are not supported")
+        self.a = -self.mu / (2 * energy) #semi-major axis, negative for a hyperbolic orbit
+        e_vector = ((v @ v - self.mu / distance) * r - (r @ v) * v) / self.mu
+        self.e = np.linalg.norm(e_vector) #eccentricity
+        #unit vectors towards periapsis and 90 degrees ahead of it in the direction of motion; a circular orbit
+        #has no periapsis, so the starting position is used instead
+        self.p = e_vector / self.e if self.e > 1e-12 else r / distance
+        self.q = np.sign(h) * np.array([-self.p[1], self.p[0]])
+        self.n = np.sqrt(self.mu / abs(self.a)**3) #mean motion
+        x, y = r @ self.p, r @ self.q
+        if self.e < 1:
+            self.b = self.a * np.sqrt(1 - self.e**2) #semi-minor axis
+            E0 = np.arctan2(y / self.b, x / self.a + self.e)
+            self.M0 = E0 - self.e * np.sin(E0) #mean anomaly at time 0
+        else:
+            self.b = abs(self.a) * np.sqrt(self.e**2 - 1)
+            H0 = np.arcsinh(y / self.b)
+            self.M0 = self.e * np.sinh(H0) - H0
+
+    @property
+    def period(self):
+        return 2 * np.pi / self.n if self.e < 1 else np.inf
+
+    def relative_state(self, times):
+        '''
+        Position and velocity of the secondary relative to the primary at every time, as two (len(times), 2) arrays
+        '''
+        E = solve_kepler(self.M0 + self.n * np.asarray(times, dtype=float), self.e)
+        if self.e < 1:
+            dE = self.n / (1 - self.e * np.cos(E)) #rate of change of the eccentric anomaly
+            x, y = self.a * (np.cos(E) - self.e), self.b * np.sin(E)
+            vx, vy = -self.a * np.sin(E) * dE, self.b * np.cos(E) * dE
+        else:
+            dE = self.n / (self.e * np.cosh(E) - 1)
+            x, y = abs(self.a) * (self.e - np.cosh(E)), self.b * np.sinh(E)
+            vx, vy = -abs(self.a) * np.sinh(E) * dE, self.b * np.cosh(E) * dE
+        r = x[:, np.newaxis] * self.p + y[:, np.newaxis] * self.q
+        v = vx[:, np.newaxis] * self.p + vy[:, np.newaxis] * self.q
+        return r, v
+
+    def propagate(self, times):
+        '''
+        Positions and velocities of both bodies at every time (seconds after the state the orbit was made from),
+        as dictionaries of (len(times), 2) arrays keyed by body name
+        '''
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        r, v = self.relative_state(times)
+        centre = self.barycentre + times[:, np.newaxis] * self.barycentre_velocity
+        positions = {body.name: centre + fraction * r for body, fraction in zip(self.bodies, self.fractions)}
+        velocities = {body.name: self.barycentre_velocity + fraction * v for body, fraction in zip(self.bodies, self.fractions)}
+        return positions, velocities
+
 class OrbitalMotion:
-    def __init__(self, bodies, dt):
+    def __init__(self, bodies, dt, method='euler', record_stride=1, engine='vectorized'):
         self.dt = dt #time step
         self.bodies = bodies #list of celestial bodies in the system
         self.G = 6.67430e-11 #gravitational constant
-        self.positions = {body.name: [] for body in bodies} #dictionary to store positions over time
-        self.kinetic_energies = [] #list to store KE at every time step
+        #'euler' steps the bodies numerically; 'kepler' evaluates the exact two-body orbit, so it needs two bodies
+        if method not in ('euler', 'kepler'):
+            raise ValueError(f"Unknown method '{method}', expected 'euler' or 'kepler'")
+        if method == 'kepler' and len(bodies) != 2:
+            warnings.warn(f"The Kepler propagator needs exactly two bodies, got {len(bodies)}; using Euler integration")
+            method = 'euler'
+        self.method = method
+        #'vectorized' takes each euler step with numpy, 'numba' takes all the steps of a run in one compiled call
+        if engine not in ('vectorized', 'numba'):
+            raise ValueError(f"Unknown engine '{engine}', expected 'vectorized' or 'numba'")
+        if engine == 'numba' and not NUMBA_AVAILABLE:
+            warnings.warn("Numba is not installed, falling back to the vectorized engine")
+            engine = 'vectorized'
+        self.engine = engine
+        self.record_stride = record_stride #positions and KE are recorded every record_stride steps
+        self.steps_taken = 0
+
+        #the state of every body packed into arrays; each body's position and velocity become views of its row
+        self.mass = np.array([body.mass for body in bodies], dtype=float)
+        self.position = np.array([body.position for body in bodies], dtype=float).reshape(-1, 2)
+        self.velocity = np.array([body.velocity for body in bodies], dtype=float).reshape(-1, 2)
+        for i, body in enumerate(bodies):
+            body.position, body.velocity = self.position[i], self.velocity[i]
+        self._records = [] #preallocated blocks of recorded positions, of shape (samples, bodies, 2)
+        self._kinetic = [] #the kinetic energies at the same steps
+
+    @property
+    def positions(self):
+        '''
+        Dictionary of the recorded positions of every body, as (samples, 2) arrays
+        '''
+        self._merge_records()
+        return {body.name: self._records[0][:, i] for i, body in enumerate(self.bodies)}
+
+    @property
+    def kinetic_energies(self):
+        '''
+        The total kinetic energy at every recorded step
+        '''
+        self._merge_records()
+        return self._kinetic[0]
+
+    def _merge_records(self):
+        if len(self._records) != 1:
+            self._records = [np.concatenate(self._records) if self._records else np.empty((0, len(self.bodies), 2))]
+            self._kinetic = [np.concatenate(self._kinetic) if self._kinetic else np.empty(0)]
 
     def acceleration(self, body):
         '''
         Compute the acceleration on a body due to gravitational forces from all other bodies
         '''
-        acceleration = np.zeros(2) #acceleration vector (initially zero)
-        for thing in self.bodies:
-            if thing != body:
-                r = thing.position - body.position #displacement vector
-                distance = np.linalg.norm(r) #magnitude of distance
-                acceleration += self.G * thing.mass * r / distance**3 #applying gravitational acceleration formula
-        return acceleration
+        return accelerations(self.position, self.mass, self.G)[self.bodies.index(body)]
 
     def kinetic_energy(self):
         '''
         Compute the total kinetic energy in the system
         '''
-        return sum(0.5 * body.mass * np.linalg.norm(body.velocity)**2 for body in self.bodies) 
+        return 0.5 * np.sum(self.mass * np.sum(self.velocity**2, axis=1))
+
+    def step(self):
+        '''
+        Update the positions & velocities of all celestial bodies at once by one timestep of Euler integration
+        '''
+        self.velocity += accelerations(self.position, self.mass, self.G) * self.dt
+        self.position += self.velocity * self.dt
+        self.steps_taken += 1
 
     def update(self):
         '''
-        At each timestep, update the positions & velocities of all celestial bodies using Euler integration
+        At each timestep, update the positions & velocities of all celestial bodies, recording them if the step
+        falls on the recording stride
         '''
-        accelerations = {body.name: self.acceleration(body) for body in self.bodies} #compute accelerations for all bodies
-        for body in self.bodies: #update velocity and position for each body
-            body.velocity += accelerations[body.name] * self.dt 
-            body.position += body.velocity * self.dt
-            self.positions[body.name].append(body.position.copy()) #store the updated position
-        self.kinetic_energies.append(self.kinetic_energy()) #store kinetic energy 
-    
+        self._run(1)
+
+    def propagate(self, times):
+        '''
+        Positions and velocities of a two-body system at an array of times (seconds after the current state),
+        evaluated exactly from its orbital elements in one call, as dictionaries keyed by body name
+        '''
+        return KeplerOrbit(*self.bodies, self.G).propagate(times)
+
+    def _run(self, num_steps):
+        '''
+        Take num_steps steps, recording the positions and kinetic energy of every record_stride-th step into arrays
+        allocated up front
+        '''
+        first, stride = self.steps_taken, self.record_stride
+        samples = (first + num_steps) // stride - first // stride
+        records = np.empty((samples, len(self.bodies), 2))
+        kinetic = np.empty(samples)
+        if self.method == 'kepler':
+            #only the recorded steps are evaluated, all at once, followed by the final state
+            steps = (first // stride + 1 + np.arange(samples)) * stride - first
+            positions, velocities = self.propagate(self.dt * np.append(steps, num_steps))
+            positions = np.stack([positions[body.name] for body in self.bodies], axis=1)
+            velocities = np.stack([velocities[body.name] for body in self.bodies], axis=1)
+            records[:] = positions[:-1]
+            kinetic[:] = 0.5 * np.einsum('i,tij,tij->t', self.mass, velocities[:-1], velocities[:-1])
+            self.position[:], self.velocity[:] = positions[-1], velocities[-1]
+            self.steps_taken += num_steps
+        elif self.engine == 'numba':
+            _compiled(_euler_block)(self.position, self.velocity, self.mass, self.G, self.dt, first, num_steps, stride,
+                                    records, kinetic)
+            self.steps_taken += num_steps
+        else:
+            sample = 0
+            for _ in range(num_steps):
+                self.step()
+                if self.steps_taken % stride == 0:
+                    records[sample] = self.position #store the updated position
+                    kinetic[sample] = self.kinetic_energy() #store kinetic energy
+                    sample += 1
+        self._records.append(records)
+        self._kinetic.append(kinetic)
+
     def simulate(self, num_steps):
         '''
         Run the simulation for a given number of steps (num_steps)
         '''
-        for _ in range(num_steps):
-            self.update()
-        return {name: np.array(pos) for name, pos in self.positions.items()}, np.array(self.kinetic_energies)
-        #dictionary of positions for every celestial body and a list of kinetic energies over time
-
-#defining mass, distance beteen mars and phobos, and speed
-mars_mass = 6.4171e23
-phobos_mass = 1.0659e16
-distance_phobos_mars = 9378000
-orbital_speed_phobos = 2138
-orbital_speed_mars = (phobos_mass / mars_mass) * orbital_speed_phobos  
-
-
-#create the celestial body objects
-mars = CelestialBody("Mars", mars_mass, [0 * distance_phobos_mars, 0], [0, orbital_speed_mars])
-phobos = CelestialBody("Phobos", phobos_mass, [distance_phobos_mars, 0], [0, -orbital_speed_phobos])
-
-bodies = [mars, phobos]
-sim = OrbitalMotion(bodies, dt=60)  #timestep is 60
-positions, kinetic_energies = sim.simulate(5000) #run the simulation for 5000 steps
-
-#set up the figure
-fig, ax = plt.subplots()
-ax.set_xlim(-3 * distance_phobos_mars, 3 * distance_phobos_mars)
-ax.set_ylim(-3 * distance_phobos_mars, 3 * distance_phobos_mars)
-ax.set_aspect('equal')
-
-#create the bodies on the figure
-mars_patch = plt.Circle((0, 0), 3e6, color='red', label='Mars')
-phobos_patch = plt.Circle((0, 0), 1e6, color='blue', label='Phobos')
-ax.add_patch(mars_patch)
-ax.add_patch(phobos_patch)
-ax.legend()
-
-#extract the position arrays
-mars_pos = positions["Mars"]
-phobos_pos = positions["Phobos"]
-
-def update(frame):
-    '''
-    The update function for the animation. Takes in the current frame index in the animation, 
-    and outputs the updated figure
-    '''
-    mars_patch.center = mars_pos[frame] #update the position of mars
-    phobos_patch.center = phobos_pos[frame] #update the position of phobos
-    ax.set_title(f'{sim.kinetic_energies[frame]:.3e}') #display the KE at the current timestep
-    return mars_patch, phobos_patch
+        self._run(num_steps)
+        return self.positions, self.kinetic_energies
+        #dictionary of positions for every celestial body and an array of kinetic energies over time
+
+def main():
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    #defining mass, distance beteen mars and phobos, and speed
+    mars_mass = 6.4171e23
+    phobos_mass = 1.0659e16
+    distance_phobos_mars = 9378000
+    orbital_speed_phobos = 2138
+    orbital_speed_mars = (phobos_mass / mars_mass) * orbital_speed_phobos  
+
+
+    #create the celestial body objects
+    mars = CelestialBody("Mars", mars_mass, [0 * distance_phobos_mars, 0], [0, orbital_speed_mars])
+    phobos = CelestialBody("Phobos", phobos_mass, [distance_phobos_mars, 0], [0, -orbital_speed_phobos])
+
+    bodies = [mars, phobos]
+    sim = OrbitalMotion(bodies, dt=60, method='kepler')  #timestep is 60; two bodies follow their exact orbit
+    positions, kinetic_energies = sim.simulate(5000) #run the simulation for 5000 steps
+
+    #set up the figure
+    fig, ax = plt.subplots()
+    ax.set_xlim(-3 * distance_phobos_mars, 3 * distance_phobos_mars)
+    ax.set_ylim(-3 * distance_phobos_mars, 3 * distance_phobos_mars)
+    ax.set_aspect('equal')
+
+    #create the bodies on the figure
+    mars_patch = plt.Circle((0, 0), 3e6, color='red', label='Mars')
+    phobos_patch = plt.Circle((0, 0), 1e6, color='blue', label='Phobos')
+    ax.add_patch(mars_patch)
+    ax.add_patch(phobos_patch)
+    ax.legend()
+
+    #extract the position arrays
+    mars_pos = positions["Mars"]
+    phobos_pos = positions["Phobos"]
+
+    def update(frame):
+        '''
+        The update function for the animation. Takes in the current frame index in the animation, 
+        and outputs the updated figure
+        '''
+        mars_patch.center = mars_pos[frame] #update the position of mars
+        phobos_patch.center = phobos_pos[frame] #update the position of phobos
+        ax.set_title(f'{sim.kinetic_energies[frame]:.3e}') #display the KE at the current timestep
+        return mars_patch, phobos_patch
 
-#create and display the simulation
-ani = animation.FuncAnimation(fig, update, frames=len(mars_pos), interval=1)
-plt.show()
+    #create and display the simulation
+    ani = animation.FuncAnimation(fig, update, frames=len(mars_pos), interval=1)
+    plt.show()
 
+if __name__ == '__main__':
+    main()
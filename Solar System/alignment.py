@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+import numpy as np
+
+# Default allowance of +-5 degrees about the mean line, as used in the report
+DEFAULT_TOLERANCE = np.sin(np.pi / 36)
+
+
+@dataclass
+class AlignmentEvent:
+    '''
+    One planetary alignment: a run of consecutive aligned records merged into a single event
+    '''
+    start: float # Time of the first aligned record, in years
+    end: float # Time of the last aligned record
+    peak: float # Time at which the planets were most tightly aligned
+    spread: float # Largest perpendicular distance from the mean line at the peak (sine of the angle)
+
+
+def alignment_spread(vectors):
+    '''
+    For sun-relative position vectors of shape (records, bodies, 2), return the largest perpendicular distance of
+    the normalised vectors from their mean direction at each record. Records whose mean vector is zero give inf.
+    '''
+    mean_vector = vectors.mean(axis=1)
+    mean_norm = np.linalg.norm(mean_vector, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        line_direction = mean_vector / mean_norm[:, np.newaxis]
+        normalised_vectors = vectors / np.linalg.norm(vectors, axis=2)[:, :, np.newaxis]
+    a, b = line_direction[:, np.newaxis, 0], line_direction[:, np.newaxis, 1]
+    distances = np.abs(normalised_vectors[:, :, 0] * b - normalised_vectors[:, :, 1] * a)
+    spread = distances.max(axis=1)
+    spread[mean_norm == 0] = np.inf # Skip records where the mean vector is zero
+    return spread
+
+
+def _chunks(positions, chunk_size):
+    '''
+    The records of positions as (index of the first record, array) chunks of at most chunk_size records. A
+    trajectory with segments() (see output.SegmentedTrajectory) is read one segment at a time.
+    '''
+    segments = positions.segments() if hasattr(positions, 'segments') else [(0, positions)]
+    for offset, segment in segments:
+        for first in range(0, len(segment), chunk_size):
+            yield offset + first, np.asarray(segment[first:first + chunk_size])
+
+
+def scan_alignments(positions, sample_dt, body_indices, sun_index=0, tolerance=DEFAULT_TOLERANCE, chunk_size=100000,
+                    max_gap=1, start_time=0.0):
+    '''
+    Evaluate the alignment criterion for every record of positions (records, N, 2) at once, in chunks of
+    chunk_size records so memory stays bounded (positions may be a memmap, or a SegmentedTrajectory read segment
+    by segment). Aligned records less than max_gap records apart are merged into one AlignmentEvent, which may
+    span chunks. Returns the list of events and the array of aligned times.
+    '''
+    body_indices = list(body_indices)
+    hits, events = [], []
+    run = None # The event still open at the end of the last chunk, as [first, last, peak record, peak spread]
+
+    def close(run):
+        first, last, peak, spread = run
+        events.append(AlignmentEvent(float(start_time + first * sample_dt), float(start_time + last * sample_dt),
+                                     float(start_time + peak * sample_dt), float(spread)))
+
+    for first, chunk in _chunks(positions, chunk_size):
+        vectors = chunk[:, body_indices] - chunk[:, sun_index:sun_index + 1]
+        spread = alignment_spread(vectors)
+        if first == 0:
+            spread[:1] = np.inf # The first record is skipped, as in the original step-by-step scan
+        aligned = np.flatnonzero(spread <= tolerance)
+        hits.append(aligned + first)
+        # Split into runs wherever consecutive hits are more than max_gap records apart
+        for part in np.split(aligned, np.flatnonzero(np.diff(aligned) > max_gap) + 1) if len(aligned) else []:
+            peak = part[np.argmin(spread[part])]
+            if run is not None and part[0] + first - run[1] <= max_gap:
+                run[1] = part[-1] + first
+                if spread[peak] < run[3]:
+                    run[2], run[3] = peak + first, spread[peak]
+            else:
+                if run is not None:
+                    close(run)
+                run = [part[0] + first, part[-1] + first, peak + first, spread[peak]]
+    if run is not None:
+        close(run)
+    hits = np.concatenate(hits) if hits else np.empty(0, dtype=int)
+    return events, start_time + hits * sample_dt
+
+
+def plot_alignment_events(events, positions, sample_dt, bodies, body_indices, sun_index=0, path=None, columns=4,
+                          start_time=0.0):
+    '''
+    Draw every event at its peak on one figure, with a panel per event. The figure is built without pyplot, so no
+    GUI backend is needed; it is saved to path if given, and returned either way.
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.lines import Line2D
+
+    body_indices = list(body_indices)
+    rows = max(1, -(-len(events) // columns))
+    fig = Figure(figsize=(4 * min(columns, max(1, len(events))), 4 * rows))
+    sun = bodies[sun_index]
+    colours = [bodies[i].colour for i in body_indices]
+    labels = [sun.name] + [bodies[i].name for i in body_indices]
+    legend_handles = [Line2D([0], [0], marker='o', color='w', markerfacecolor=col, markersize=10, label=lab)
+                      for col, lab in zip([sun.colour] + colours, labels)]
+    limit = 1.1 * max((abs(bodies[i].orbital_radius) for i in body_indices), default=1.0)
+
+    for n, event in enumerate(events):
+        ax = fig.add_subplot(rows, min(columns, len(events)), n + 1)
+        record = int(round((event.peak - start_time) / sample_dt))
+        vectors = np.asarray(positions[record, body_indices] - positions[record, sun_index])
+        ax.set_xlim(-limit, limit)
+        ax.set_ylim(-limit, limit)
+        ax.set_title(f'Planetary Alignment at {event.peak:.2f} years')
+        # Include the mean line we find the distance from
+        ax.axline((0, 0), vectors.mean(axis=0), linestyle='--', c='black', linewidth=0.5)
+        ax.scatter(vectors[:, 0], vectors[:, 1], c=colours)
+        ax.scatter([0], [0], c=sun.colour)
+    if events:
+        fig.axes[0].legend(handles=legend_handles)
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path)
+    return fig
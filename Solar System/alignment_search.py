@@ -0,0 +1,197 @@
+from dataclasses import dataclass, replace
+import numpy as np
+from alignment import DEFAULT_TOLERANCE, AlignmentEvent, alignment_spread, scan_alignments
+
+
+@dataclass
+class Checkpoint:
+    '''
+    The positions, velocities and previous accelerations of every body at one time, from which a run can be
+    restarted exactly where it was
+    '''
+    time: float
+    pos: np.ndarray
+    v: np.ndarray
+    prev_as: np.ndarray # Shape (2, N, 2), as in SystemState
+
+
+@dataclass
+class SearchSummary:
+    '''
+    The work done by a two-stage alignment search, to compare with recording and scanning the whole window
+    '''
+    checkpoint_steps: int # Coarse steps taken to produce the checkpoints, which are neither recorded nor scanned
+    refined_steps: int # Fine steps taken by the refinements, which are recorded
+    scanned_steps: int # Recorded steps scanned for alignments
+    candidates: int # Candidate windows predicted by the first stage
+    brute_force_steps: int # Fine steps a full run would take, record and scan
+
+    @property
+    def integrated_steps(self):
+        return self.checkpoint_steps + self.refined_steps
+
+
+def restart(config, checkpoint, num_steps, integration_method='beeman', timestep=None, **options):
+    '''
+    A Simulation of config over num_steps steps of timestep (that of config by default), starting from checkpoint
+    '''
+    from solar_system import Simulation
+
+    timestep = config.dt if timestep is None else timestep
+    sim = Simulation.from_config(replace(config, timestep=timestep, num_iterations=num_steps), integration_method,
+                                 progress=False, **options)
+    for i, p in enumerate(sim.bodies):
+        p.pos, p.v, p.prev_as = checkpoint.pos[i].copy(), checkpoint.v[i].copy(), checkpoint.prev_as[:, i].copy()
+    return sim
+
+
+def with_history(checkpoint, mass, G, dt):
+    '''
+    checkpoint with prev_as set to the accelerations dt before and at its time, so a Beeman run at dt can be
+    restarted from a state made by another integrator. The earlier positions are x - v*dt + a*dt^2/2, accurate to
+    third order in dt.
+    '''
+    from engine import get_force_backend
+
+    forces = get_force_backend('direct', G)
+    a = forces(checkpoint.pos, mass)
+    previous = forces(checkpoint.pos - checkpoint.v * dt + 0.5 * a * dt**2, mass)
+    return replace(checkpoint, prev_as=np.array([previous, a]))
+
+
+def checkpoint_run(config, total_time, every=1.0, integration_method='beeman', timestep=None, history_dt=None,
+                   **options):
+    '''
+    Step the N-body simulation of config over total_time years without keeping its trajectory, saving a
+    Checkpoint every `every` years. The run is made of one short simulation per checkpoint, each restarted from
+    the last, so any engine can be used (e.g. engine='numba') and the states are those of a single long run.
+    The run can be much coarser than the runs later restarted from the checkpoints, e.g. wisdom-holman at ten
+    times their timestep: with history_dt, every checkpoint but the initial state is given the Beeman history of
+    a run at history_dt (see with_history). Returns the checkpoints, starting with the initial state, and the
+    number of steps taken.
+    '''
+    from solar_system import Planet
+
+    timestep = config.dt if timestep is None else timestep
+    num_steps = int(round(total_time / timestep))
+    segment = max(1, int(round(every / timestep)))
+    bodies = [Planet(**p, integration_method=integration_method, config=config) for p in config.bodies]
+    pos, v = np.array([p.pos for p in bodies], dtype=np.float64), np.array([p.v for p in bodies], dtype=np.float64)
+    checkpoints = [Checkpoint(0.0, pos, v, np.zeros((2,) + pos.shape))]
+    steps = 0
+    while steps < num_steps:
+        n = min(segment, num_steps - steps)
+        sim = restart(config, checkpoints[-1], n, integration_method, timestep, record_stride=n, **options)
+        sim.simulate()
+        steps += sim.steps_taken
+        state = sim.state
+        checkpoints.append(Checkpoint(steps * timestep, state.pos.copy(), state.v.copy(), state.prev_as.copy()))
+    if history_dt is not None:
+        mass = np.array([p.mass for p in bodies], dtype=np.float64)
+        checkpoints[1:] = [with_history(c, mass, config.G, history_dt) for c in checkpoints[1:]]
+    return checkpoints, steps
+
+
+def predict_windows(checkpoints, periods, body_indices, sun_index=0, tolerance=DEFAULT_TOLERANCE,
+                    angle_margin=np.radians(2), grid_step=None, padding=0.02, chunk_size=100000):
+    '''
+    Stage one: predict when the bodies could be aligned from their mean motions alone. After each checkpoint, every
+    body is assumed to move uniformly about the sun from its angle at the checkpoint, at the mean motion 2pi/period.
+    The alignment criterion is evaluated on a grid of grid_step years with the tolerance widened by angle_margin,
+    to allow for eccentric orbits and perturbations, and by the motion over half a grid step, so no alignment is
+    missed. Returns (checkpoint index, start, end) windows, widened by padding years on each side.
+    '''
+    body_indices = list(body_indices)
+    times = np.array([c.time for c in checkpoints])
+    relative = np.array([c.pos[body_indices] - c.pos[sun_index] for c in checkpoints])
+    velocity = np.array([c.v[body_indices] - c.v[sun_index] for c in checkpoints])
+    angles = np.arctan2(relative[..., 1], relative[..., 0]) # Shape (checkpoints, bodies)
+    # Mean motion, signed by the direction of each orbit
+    direction = np.sign(relative[..., 0] * velocity[..., 1] - relative[..., 1] * velocity[..., 0])
+    motion = direction * 2 * np.pi / np.asarray(periods, dtype=np.float64)[body_indices]
+
+    fastest = np.abs(motion).max()
+    grid_step = np.arcsin(tolerance) / fastest if grid_step is None else grid_step
+    widened = np.sin(min(np.pi / 2, np.arcsin(tolerance) + angle_margin + fastest * grid_step))
+
+    windows = []
+    grid = np.arange(times[0], times[-1], grid_step)
+    for first in range(0, len(grid), chunk_size):
+        t = grid[first:first + chunk_size]
+        anchor = np.clip(np.searchsorted(times, t, side='right') - 1, 0, len(times) - 1)
+        theta = angles[anchor] + motion[anchor] * (t - times[anchor])[:, np.newaxis]
+        vectors = np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+        hits = np.flatnonzero(alignment_spread(vectors) <= widened)
+        if not len(hits):
+            continue
+        # Runs of consecutive grid points become windows, each refined from the checkpoint before it
+        breaks = np.flatnonzero(np.diff(hits) > 1) + 1
+        for run in np.split(hits, breaks):
+            start, end = max(times[0], t[run[0]] - padding), min(times[-1], t[run[-1]] + padding)
+            index = int(np.searchsorted(times, start, side='right') - 1)
+            if windows and windows[-1][0] == index and start <= windows[-1][2]:
+                windows[-1] = (index, windows[-1][1], max(end, windows[-1][2]))
+            else:
+                windows.append((index, start, end))
+    return windows
+
+
+def refine_window(config, checkpoint, start, end, body_indices, sun_index=0, tolerance=DEFAULT_TOLERANCE,
+                  integration_method='beeman', **options):
+    '''
+    Stage two: restart the N-body simulation from checkpoint, step it to the end of the window at the timestep of
+    config and scan the steps inside the window for alignments. Returns the events and the numbers of steps taken
+    and scanned.
+    '''
+    num_steps = int(np.ceil((end - checkpoint.time) / config.dt - 1e-9))
+    sim = restart(config, checkpoint, num_steps, integration_method, **options)
+    sim.simulate()
+    first = max(0, int(np.floor((start - checkpoint.time) / config.dt + 1e-9)))
+    positions = sim.trajectory.positions[first:sim.trajectory.count]
+    events, times = scan_alignments(positions, config.dt, body_indices, sun_index, tolerance,
+                                    start_time=checkpoint.time + first * config.dt)
+    return events, sim.steps_taken, len(positions)
+
+
+def search_alignments(config, total_time, periods, body_indices=range(1, 6), sun_index=0, tolerance=DEFAULT_TOLERANCE,
+                      checkpoint_every=1.0, checkpoints=None, checkpoint_method='wisdom-holman',
+                      checkpoint_timestep=None, checkpoint_options=None, integration_method='beeman', **options):
+    '''
+    Find the alignment events of the bodies over total_time years in two stages: predict candidate windows from
+    the mean motions (periods, e.g. the orbital periods measured by a shorter run), then refine each window with a
+    short N-body run at the timestep of config from the checkpoint before it. Unless given, the checkpoints are
+    made cheaply by checkpoint_run with checkpoint_method at checkpoint_timestep (ten times that of config by
+    default) and checkpoint_options, so only the steps inside or just before a window are taken at the fine
+    timestep. The options apply to the refinements. Returns the events in time order and a SearchSummary of the
+    work done.
+    '''
+    body_indices = list(body_indices)
+    checkpoint_steps = 0
+    if checkpoints is None:
+        checkpoint_timestep = 10 * config.dt if checkpoint_timestep is None else checkpoint_timestep
+        # Checkpoints of a run like the refinements already carry its history
+        same_run = checkpoint_method == integration_method and checkpoint_timestep == config.dt
+        checkpoints, checkpoint_steps = checkpoint_run(config, total_time, checkpoint_every, checkpoint_method,
+                                                       checkpoint_timestep, None if same_run else config.dt,
+                                                       **(checkpoint_options or {}))
+    windows = predict_windows(checkpoints, periods, body_indices, sun_index, tolerance)
+    events, refined_steps, scanned_steps = [], 0, 0
+    for index, start, end in windows:
+        found, steps, scanned = refine_window(config, checkpoints[index], start, end, body_indices, sun_index,
+                                              tolerance, integration_method, **options)
+        events += found
+        refined_steps += steps
+        scanned_steps += scanned
+    # Neighbouring windows can overlap, so an event near their edges may be found twice
+    events = sorted(events, key=lambda event: event.peak)
+    merged = []
+    for event in events:
+        if merged and event.start <= merged[-1].end + config.dt:
+            last = merged[-1]
+            peak = last if last.spread <= event.spread else event
+            merged[-1] = AlignmentEvent(min(last.start, event.start), max(last.end, event.end), peak.peak, peak.spread)
+        else:
+            merged.append(event)
+    summary = SearchSummary(checkpoint_steps, refined_steps, scanned_steps, len(windows),
+                            int(round(total_time / config.dt)))
+    return merged, summary
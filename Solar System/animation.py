@@ -1,49 +1,178 @@
-from solar_system import Planet, Simulation, dt, total_time, num_steps, config
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib.lines import Line2D
+from solar_system import Simulation, config
+import queue
+import sys
+import threading
+import numpy as np
 
-def main():
-    # Run the simulation  
 
-    planets_beeman = [Planet(**p, integration_method='beeman') for p in config["bodies"]]
-    sim_beeman = Simulation(dt, total_time, num_steps, planets_beeman)
-    sim_beeman.simulate()
+class FrameStream:
+    '''
+    Runs a simulation in a background thread (the producer) and passes every frame_every-th set of positions
+    through a bounded queue to the renderer (the consumer). When the queue is full the simulation waits, so it
+    never runs far ahead of the animation, and memory stays bounded however long the run.
+    '''
+    _END = None # Put on the queue when the simulation has finished
 
-    # Initialise the animation figure
+    def __init__(self, sim: Simulation, frame_every=100, queue_size=64):
+        self.sim = sim
+        self.frame_every = frame_every
+        self.frames = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self.error = None # Exception raised by the simulation, if any
 
-    fig, ax = plt.subplots(figsize=(10,10))
-    ax.set_xlim(-30, 30)
-    ax.set_ylim(-30, 30)
-    ax.set_xlabel("X Position, AUs")
-    ax.set_ylabel("Y Position, AUs")
-    ax.set_title("Planetary Orbit Simulation")
-    ax.legend()
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Ask the simulation to stop at its next frame, e.g. when the window is closed
+        '''
+        self._stop.set()
+
+    def _produce(self):
+        try:
+            self.sim.simulate(on_frame=self._put, frame_every=self.frame_every)
+        except _Stopped:
+            pass
+        except Exception as error:
+            self.error = error
+        self._put_blocking(self._END)
+
+    def _put(self, step, pos):
+        # Copy, as the positions are the simulation's own arrays
+        if not self._put_blocking((step * self.sim.dt, np.array(pos))):
+            raise _Stopped
+
+    def _put_blocking(self, item):
+        while not self._stop.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        '''
+        Yield (time, positions) frames as the simulation produces them, until it finishes
+        '''
+        while True:
+            frame = self.frames.get()
+            if frame is self._END:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield frame
+
+
+class _Stopped(Exception):
+    pass
 
-    # Plot the bodies
 
-    xs = [p.positions[0][0] for p in planets_beeman]
-    ys = [p.positions[0][1] for p in planets_beeman]
-    colours = [p.colour for p in planets_beeman]
-    labels = [p.name for p in planets_beeman]
-    planet_plots = ax.scatter(xs, ys, color=colours)
+class OrbitScene:
+    '''
+    The artists of one animation frame: a marker per body, an optional trail of its last trail_length frames, and
+    the time. update() only changes the data of the artists, so frames can be blitted.
+    '''
+    def __init__(self, ax, bodies, trail_length=50, limit=30):
+        from matplotlib.lines import Line2D
 
-    # Create a legend - stack overflow!
+        ax.set_xlim(-limit, limit)
+        ax.set_ylim(-limit, limit)
+        ax.set_xlabel("X Position, AUs")
+        ax.set_ylabel("Y Position, AUs")
+        ax.set_title("Planetary Orbit Simulation")
+        colours = [p.colour for p in bodies]
+        self.n_bodies = len(bodies) # Any test particles after the bodies are not drawn
+        self.markers = ax.scatter(np.zeros(len(bodies)), np.zeros(len(bodies)), color=colours, zorder=3)
+        self.trail_length = trail_length
+        self.trails = [ax.plot([], [], color=colour, linewidth=0.8, alpha=0.6)[0] for colour in colours] if trail_length else []
+        self._history = np.empty((trail_length, len(bodies), 2)) # Ring buffer of the last trail_length frames
+        self._count = 0
+        self.label = ax.text(0.02, 0.97, '', transform=ax.transAxes, va='top')
+        # Create a legend - stack overflow!
+        legend_handles = [Line2D([0], [0], marker='o', color='w', markerfacecolor=col, markersize=10, label=p.name)
+                          for col, p in zip(colours, bodies)]
+        ax.legend(handles=legend_handles, loc='upper right')
 
-    legend_handles = [Line2D([0], [0], marker='o', color='w', markerfacecolor=col, markersize=10, label=lab) 
-                      for col, lab in zip(colours, labels)]
-    ax.legend(handles=legend_handles) 
+    @property
+    def artists(self):
+        return [self.markers, self.label] + self.trails
 
-    # Animate simulation
+    def update(self, frame):
+        time, pos = frame
+        pos = pos[:self.n_bodies]
+        self.markers.set_offsets(pos)
+        self.label.set_text(f'{time:.1f} years')
+        if self.trail_length:
+            self._history[self._count % self.trail_length] = pos
+            self._count += 1
+            # Oldest to newest frame of the ring buffer
+            order = np.arange(self._count - min(self._count, self.trail_length), self._count) % self.trail_length
+            for i, trail in enumerate(self.trails):
+                trail.set_data(self._history[order, i, 0], self._history[order, i, 1])
+        return self.artists
 
-    def update(frame):
-        positions = [p.positions[frame] for p in planets_beeman]
-        planet_plots.set_offsets(positions)
-        return planet_plots,
 
-    ani = animation.FuncAnimation(fig, update, frames=min(num_steps, len(planets_beeman[0].positions)), interval=1, blit=False)
+def animate(sim: Simulation, frame_every=100, trail_length=50, queue_size=64, interval=1):
+    '''
+    Show the simulation in a window while it runs. Frames are rendered with blitting as soon as the simulation
+    produces them, so the first frame appears immediately. Closing the window stops the simulation.
+    '''
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
 
+    fig, ax = plt.subplots(figsize=(10,10))
+    scene = OrbitScene(ax, sim.bodies, trail_length)
+    # Start simulating once the figure is built, so the two do not compete before the first frame
+    stream = FrameStream(sim, frame_every, queue_size).start()
+    fig.canvas.mpl_connect('close_event', lambda event: stream.stop())
+    ani = animation.FuncAnimation(fig, scene.update, frames=iter(stream), init_func=lambda: scene.artists,
+                                  interval=interval, blit=True, cache_frame_data=False, repeat=False)
     plt.show()
+    stream.stop()
+    return ani
+
+
+def export_video(sim: Simulation, path, frame_every=100, trail_length=50, fps=30, dpi=100, writer=None):
+    '''
+    Render the simulation straight to a video file while it runs, without a GUI: every frame_every-th step is
+    drawn and handed to a matplotlib writer (ffmpeg by default, Pillow for .gif files). Returns the number of
+    frames written.
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import matplotlib.animation as animation
+
+    if writer is None:
+        writer = animation.PillowWriter(fps=fps) if path.endswith('.gif') else animation.FFMpegWriter(fps=fps)
+    fig = Figure(figsize=(10,10))
+    FigureCanvasAgg(fig)
+    scene = OrbitScene(fig.add_subplot(), sim.bodies, trail_length)
+    frames = 0
+
+    def write(step, pos):
+        nonlocal frames
+        scene.update((step * sim.dt, pos))
+        writer.grab_frame()
+        frames += 1
+
+    with writer.saving(fig, path, dpi):
+        sim.simulate(on_frame=write, frame_every=frame_every)
+    return frames
+
+
+def main():
+    # Animate the simulation as it runs; pass a file name (e.g. orbits.mp4 or orbits.gif) to export a video instead
+    frame_every = 100
+    sim_beeman = Simulation.from_config(config, 'beeman', record_stride=frame_every, progress=False)
+    if len(sys.argv) > 1:
+        frames = export_video(sim_beeman, sys.argv[1], frame_every)
+        print(f"Wrote {frames} frames to {sys.argv[1]}")
+    else:
+        animate(sim_beeman, frame_every)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
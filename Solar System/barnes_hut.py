@@ -0,0 +1,159 @@
+import numpy as np
+
+MAX_DEPTH = 16 # Levels of the quadtree; cells at the deepest level are 2^-16 of the root size
+
+
+def morton_keys(ix, iy):
+    '''
+    Interleave the bits of integer cell coordinates (below 2^MAX_DEPTH) into Z-order keys
+    '''
+    def spread(v):
+        v = v.astype(np.uint64)
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+        v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+        return v
+    return spread(ix) | (spread(iy) << np.uint64(1))
+
+
+class QuadTree:
+    '''
+    Linear quadtree over a set of point masses. Bodies are sorted by Morton key, and the cells of each level are
+    the runs of equal key prefixes, so every node's mass, centre of mass and children are found with array
+    operations. Nodes of all levels are stored in flat arrays, root first.
+    '''
+    def __init__(self, pos, mass):
+        lower = pos.min(axis=0)
+        self.size = max(np.ptp(pos, axis=0).max(), 1e-12) * (1 + 1e-9) # Side of the root cell
+        self.lower = lower
+        keys = self.keys(pos)
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        sorted_mass = mass[self.order]
+        sorted_pos = pos[self.order]
+        self.sorted_pos, self.sorted_mass = sorted_pos, sorted_mass
+
+        node_key, node_level, node_start, node_count = [], [], [], []
+        for level in range(MAX_DEPTH + 1):
+            prefix = sorted_keys >> np.uint64(2 * (MAX_DEPTH - level))
+            starts = np.flatnonzero(np.r_[True, prefix[1:] != prefix[:-1]])
+            node_key.append(prefix[starts])
+            node_level.append(np.full(len(starts), level))
+            node_start.append(starts)
+            node_count.append(np.diff(np.r_[starts, len(prefix)]))
+        self.level_offsets = np.cumsum([0] + [len(k) for k in node_key])
+        self.key = np.concatenate(node_key)
+        self.level = np.concatenate(node_level)
+        self.start = np.concatenate(node_start)
+        self.count = np.concatenate(node_count)
+        self.side = self.size / 2.0**self.level
+
+        # Mass and centre of mass of every node, summed over its contiguous run of sorted bodies
+        weighted = np.concatenate([np.zeros((1, 2)), np.cumsum(sorted_mass[:, None] * sorted_pos, axis=0)])
+        cumulative_mass = np.concatenate([[0.0], np.cumsum(sorted_mass)])
+        end = self.start + self.count
+        self.mass = cumulative_mass[end] - cumulative_mass[self.start]
+        moment = weighted[end] - weighted[self.start]
+        geometric = (sorted_pos[self.start] + sorted_pos[end - 1]) / 2 # For massless nodes
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.com = np.where(self.mass[:, None] > 0, moment / self.mass[:, None], geometric)
+        single = self.count == 1 # Exact point masses
+        self.com[single] = sorted_pos[self.start[single]]
+        self.mass[single] = sorted_mass[self.start[single]]
+
+        # Children of every node: the nodes one level down whose key prefix is the node's key
+        self.child_start = np.zeros(len(self.key), dtype=np.int64)
+        self.child_count = np.zeros(len(self.key), dtype=np.int64)
+        for level in range(MAX_DEPTH):
+            parents = slice(self.level_offsets[level], self.level_offsets[level + 1])
+            children = slice(self.level_offsets[level + 1], self.level_offsets[level + 2])
+            parent_of = np.searchsorted(self.key[parents], self.key[children] >> np.uint64(2))
+            counts = np.bincount(parent_of, minlength=parents.stop - parents.start)
+            self.child_count[parents] = counts
+            self.child_start[parents] = self.level_offsets[level + 1] + np.cumsum(counts) - counts
+
+    def keys(self, pos):
+        '''
+        Morton keys of the deepest-level cells containing each position (clipped to the root cell)
+        '''
+        cells = np.floor((pos - self.lower) / self.size * 2**MAX_DEPTH)
+        cells = np.clip(cells, 0, 2**MAX_DEPTH - 1).astype(np.uint64)
+        return morton_keys(cells[:, 0], cells[:, 1])
+
+
+class BarnesHutForce:
+    '''
+    Barnes-Hut gravity backend. A quadtree is built over the bodies each call, and a cell of side s at distance d
+    from a body is treated as a point mass at its centre of mass when s/d < theta, so each acceleration costs
+    O(log N) instead of O(N). theta=0 reproduces direct summation. All bodies walk the tree together, level by
+    level, in chunks of chunk_size bodies to bound memory.
+    '''
+    def __init__(self, G, theta=0.5, chunk_size=4096):
+        self.G = G
+        self.theta = theta
+        self.chunk_size = chunk_size
+
+    def __call__(self, pos, mass, n_sources=None):
+        '''
+        Returns the (N, 2) array of accelerations on every body due to the first n_sources bodies (by default all
+        of them); the tree is built over the sources only
+        '''
+        n_sources = len(pos) if n_sources is None else n_sources
+        tree = QuadTree(pos[:n_sources], mass[:n_sources])
+        acc = np.zeros_like(pos, dtype=np.float64)
+        target_keys = tree.keys(pos)
+        for first in range(0, len(pos), self.chunk_size):
+            chunk = slice(first, first + self.chunk_size)
+            acc[chunk] = self._walk(tree, pos[chunk], target_keys[chunk])
+        return self.G * acc
+
+    def _walk(self, tree, targets, target_keys):
+        n = len(targets)
+        acc = np.zeros((n, 2))
+        body = np.arange(n) # Pairs of (target body, tree node) still to be resolved
+        node = np.zeros(n, dtype=np.int64)
+        theta_sq = self.theta**2
+        while len(body):
+            d = tree.com[node] - targets[body]
+            r_sq = np.einsum('ij,ij->i', d, d)
+            # A node containing the target must be opened, however far its centre of mass is
+            shift = (2 * (MAX_DEPTH - tree.level[node])).astype(np.uint64)
+            contains = (target_keys[body] >> shift) == tree.key[node]
+            single = tree.count[node] == 1
+            far = (tree.side[node]**2 < theta_sq * r_sq) & ~contains
+            accept = (single | far) & (r_sq > 0) # r_sq == 0 is the body itself
+            self._accumulate(acc, body[accept], d[accept], r_sq[accept], tree.mass[node[accept]])
+
+            # Unresolved multi-body cells at the deepest level are summed body by body
+            opened = ~single & ~far
+            deepest = opened & (tree.child_count[node] == 0)
+            if deepest.any():
+                counts = tree.count[node[deepest]]
+                members = _expand(tree.start[node[deepest]], counts)
+                pairs = np.repeat(body[deepest], counts)
+                d_members = tree.sorted_pos[members] - targets[pairs]
+                r_members = np.einsum('ij,ij->i', d_members, d_members)
+                keep = r_members > 0
+                self._accumulate(acc, pairs[keep], d_members[keep], r_members[keep], tree.sorted_mass[members[keep]])
+
+            # Everything else is replaced by its children
+            opened &= ~deepest
+            counts = tree.child_count[node[opened]]
+            node = _expand(tree.child_start[node[opened]], counts)
+            body = np.repeat(body[opened], counts)
+        return acc
+
+    @staticmethod
+    def _accumulate(acc, body, d, r_sq, mass):
+        weight = mass / (r_sq * np.sqrt(r_sq))
+        acc[:, 0] += np.bincount(body, weights=weight * d[:, 0], minlength=len(acc))
+        acc[:, 1] += np.bincount(body, weights=weight * d[:, 1], minlength=len(acc))
+
+
+def _expand(starts, counts):
+    '''
+    Concatenate the index ranges [start, start + count) for every pair of start and count
+    '''
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(counts.sum()) - offsets
@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import replace
+import numpy as np
+from solar_system import Simulation, config
+from integrators import INTEGRATORS
+from profiling import Profiler
+from kernels import BLOCK_KERNELS, NUMBA_AVAILABLE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'Orbital Motion'))
+from orbital_motion import CelestialBody, OrbitalMotion
+
+# The cases run by the suite; --quick keeps the smallest of each
+SOLAR_SYSTEM_BODIES = (9, 50, 200)
+SOLAR_SYSTEM_STEPS = (1000, 5000)
+ORBITAL_MOTION_BODIES = (2, 10, 30)
+ORBITAL_MOTION_STEPS = (500, 2000)
+SEED = 0
+
+
+def solar_system_config(n_bodies, num_steps):
+    '''
+    The parameters file with its first n_bodies bodies, topped up with an asteroid belt of massive bodies of seeded
+    masses, evenly spaced between 2.2 and 3.3 AU so that no two start close together
+    '''
+    rng = np.random.default_rng(SEED)
+    extra = max(0, n_bodies - len(config.bodies))
+    belt = [{'name': f'asteroid {i}', 'mass': float(mass), 'orbital_radius': float(radius), 'colour': '#888888'}
+            for i, (mass, radius) in enumerate(zip(rng.uniform(1e-6, 1e-4, extra), np.linspace(2.2, 3.3, extra)))]
+    return replace(config, bodies=config.bodies[:n_bodies] + belt, num_iterations=num_steps)
+
+
+def orbital_motion_bodies(n_bodies):
+    '''
+    Mars and n_bodies - 1 small moons on circular orbits at seeded radii and angles
+    '''
+    rng = np.random.default_rng(SEED)
+    G, mars_mass = 6.67430e-11, 6.4171e23
+    bodies = [CelestialBody("Mars", mars_mass, [0, 0], [0, 0])]
+    for i in range(n_bodies - 1):
+        radius, angle = rng.uniform(9e6, 3e7), rng.uniform(0, 2 * np.pi)
+        speed = np.sqrt(G * mars_mass / radius)
+        bodies.append(CelestialBody(f"moon {i}", 1e16, [radius * np.cos(angle), radius * np.sin(angle)],
+                                    [-speed * np.sin(angle), speed * np.cos(angle)]))
+    return bodies
+
+
+def run_solar_system(engine, integrator, n_bodies, num_steps, repeats):
+    '''
+    Best of repeats runs of one Simulation case, with its per-phase timings
+    '''
+    best = None
+    for _ in range(repeats):
+        profiler = Profiler()
+        sim = Simulation.from_config(solar_system_config(n_bodies, num_steps), integrator, engine=engine,
+                                     progress=False, profiler=profiler)
+        sim.simulate()
+        if best is None or profiler.total < best.total:
+            best = profiler
+    return {'seconds': best.total, 'steps_per_second': num_steps / best.total, 'phases': best.results()}
+
+
+def run_orbital_motion(n_bodies, num_steps, repeats, method='euler', engine='vectorized'):
+    best = np.inf
+    for _ in range(repeats):
+        sim = OrbitalMotion(orbital_motion_bodies(n_bodies), dt=60, method=method, engine=engine)
+        start = time.perf_counter()
+        sim.simulate(num_steps)
+        best = min(best, time.perf_counter() - start)
+    return {'seconds': best, 'steps_per_second': num_steps / best}
+
+
+def cases(quick=False):
+    '''
+    Every case of the suite, as dictionaries of the parameters that identify it
+    '''
+    first = (lambda values: values[:1]) if quick else (lambda values: values)
+    for n_bodies in first(SOLAR_SYSTEM_BODIES):
+        for num_steps in first(SOLAR_SYSTEM_STEPS):
+            for integrator in INTEGRATORS:
+                engines = ['vectorized'] + (['numba'] if NUMBA_AVAILABLE and integrator in BLOCK_KERNELS else [])
+                for engine in engines:
+                    yield {'system': 'solar_system', 'engine': engine, 'integrator': integrator, 'bodies': n_bodies,
+                           'steps': num_steps}
+    for n_bodies in first(ORBITAL_MOTION_BODIES):
+        for num_steps in first(ORBITAL_MOTION_STEPS):
+            for engine in ['vectorized'] + (['numba'] if NUMBA_AVAILABLE else []):
+                yield {'system': 'orbital_motion', 'engine': engine, 'integrator': 'euler-cromer', 'bodies': n_bodies,
+                       'steps': num_steps}
+            if n_bodies == 2:
+                # The exact two-body orbit, evaluated at every step at once
+                yield {'system': 'orbital_motion', 'engine': 'kepler', 'integrator': 'kepler', 'bodies': n_bodies,
+                       'steps': num_steps}
+
+
+def case_key(case):
+    return '/'.join(str(case[key]) for key in ('system', 'engine', 'integrator', 'bodies', 'steps'))
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'processor': platform.processor(),
+            'numba': NUMBA_AVAILABLE}
+
+
+def run_suite(quick=False, repeats=1):
+    if NUMBA_AVAILABLE:
+        # Compile the kernels first, so the numba cases time the stepping only
+        for integrator in BLOCK_KERNELS:
+            run_solar_system('numba', integrator, 9, 10, 1)
+        run_orbital_motion(2, 10, 1, engine='numba')
+    results = []
+    for case in cases(quick):
+        if case['system'] == 'solar_system':
+            timing = run_solar_system(case['engine'], case['integrator'], case['bodies'], case['steps'], repeats)
+        else:
+            if case['engine'] == 'kepler':
+                timing = run_orbital_motion(case['bodies'], case['steps'], repeats, 'kepler')
+            else:
+                timing = run_orbital_motion(case['bodies'], case['steps'], repeats, engine=case['engine'])
+        results.append(dict(case, key=case_key(case), **timing))
+        print(f"{results[-1]['key']}: {timing['seconds']:.3f} s, {timing['steps_per_second']:.0f} steps/s")
+    return {'metadata': metadata(), 'results': results}
+
+
+def compare(baseline, current, threshold=0.1):
+    '''
+    Print the change in run time of every case found in both result files, flagging those more than threshold
+    (relative) slower than the baseline. Returns the keys of the regressions.
+    '''
+    old = {result['key']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        if result['key'] not in old:
+            continue
+        ratio = result['seconds'] / old[result['key']]['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(result['key'])
+            flag = '  <-- slower'
+        print(f"{result['key']}: {old[result['key']]['seconds']:.3f} s -> {result['seconds']:.3f} s ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Simulation and OrbitalMotion and write the results as JSON")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--quick', action='store_true', help="only the smallest body and step counts")
+    parser.add_argument('--repeats', type=int, default=1, help="keep the best of this many runs of each case")
+    parser.add_argument('--compare', metavar='BASELINE', help="results of a previous version to compare against")
+    args = parser.parse_args()
+
+    results = run_suite(args.quick, args.repeats)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results)
+        print(f"{len(regressions)} cases more than 10% slower than {args.compare}")
+
+if __name__ == '__main__':
+    main()
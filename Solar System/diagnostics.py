@@ -0,0 +1,54 @@
+import numpy as np
+
+# Columns of Simulation.diagnostics
+DIAGNOSTIC_FIELDS = ('time', 'kinetic', 'potential', 'total', 'angular_momentum')
+
+
+def kinetic_energy(v, mass):
+    return 0.5 * np.dot(mass, np.einsum('ij,ij->i', v, v))
+
+
+def angular_momentum(pos, v, mass):
+    '''
+    Total angular momentum about the origin (its component out of the plane)
+    '''
+    return np.dot(mass, pos[:, 0] * v[:, 1] - pos[:, 1] * v[:, 0])
+
+
+def potential_energy(pos, mass, G, block_elements=2**22):
+    '''
+    Gravitational potential energy of every pair of bodies, computed in blocks of rows so that no more than
+    block_elements pairs are held at once
+    '''
+    n = len(pos)
+    rows = min(n, max(1, block_elements // max(n, 1)))
+    total = 0.0
+    for first in range(0, n, rows):
+        last = min(first + rows, n)
+        diff = pos[np.newaxis, :, :] - pos[first:last, np.newaxis, :]
+        dist = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+        upper = np.arange(n)[np.newaxis, :] > np.arange(first, last)[:, np.newaxis] # Count each pair once
+        total += np.sum(mass[first:last, np.newaxis] * mass[np.newaxis, :] / np.where(upper, dist, np.inf))
+    return -G * total
+
+
+def energy_diagnostics(pos, v, mass, n_massive, G, forces=None):
+    '''
+    Kinetic, potential and total energy and angular momentum of the massive bodies. A force backend that kept the
+    pair distances of its last call (DirectForce) provides the potential energy without recomputing them.
+    '''
+    if hasattr(forces, 'potential_energy'):
+        potential = forces.potential_energy(pos, mass, n_massive)
+    else:
+        potential = potential_energy(pos[:n_massive], mass[:n_massive], G)
+    pos, v, mass = pos[:n_massive], v[:n_massive], mass[:n_massive]
+    kinetic = kinetic_energy(v, mass)
+    return kinetic, potential, kinetic + potential, angular_momentum(pos, v, mass)
+
+
+def relative_drift(energies):
+    '''
+    Relative change of each energy from the first one, |E - E0| / |E0|
+    '''
+    energies = np.asarray(energies, dtype=np.float64)
+    return np.abs(energies / energies[0] - 1) if len(energies) else energies
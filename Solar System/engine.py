@@ -0,0 +1,129 @@
+import numpy as np
+from barnes_hut import BarnesHutForce
+from diagnostics import potential_energy
+
+
+class SystemState:
+    '''
+    Struct-of-arrays store for the positions, velocities, masses and previous accelerations of every body. Massless
+    test particles, if any, follow the n_massive massive bodies in the same arrays.
+    '''
+    def __init__(self, bodies, particles=None):
+        self.n_massive = len(bodies)
+        self.names = [p.name for p in bodies]
+        self.mass = np.array([p.mass for p in bodies], dtype=np.float64)
+        self.pos = np.array([p.pos for p in bodies], dtype=np.float64) # Shape (N, 2)
+        self.v = np.array([p.v for p in bodies], dtype=np.float64) # Shape (N, 2)
+        # prev_as[0] is the acceleration at the previous step and prev_as[1] the acceleration at the current positions
+        self.prev_as = np.ascontiguousarray(np.array([p.prev_as for p in bodies], dtype=np.float64).transpose(1, 0, 2))
+        if particles is not None and len(particles):
+            self.names += particles.names
+            self.mass = np.concatenate([self.mass, np.zeros(len(particles))])
+            self.pos = np.concatenate([self.pos, particles.pos])
+            self.v = np.concatenate([self.v, particles.v])
+            self.prev_as = np.concatenate([self.prev_as, np.zeros((2, len(particles), 2))], axis=1)
+
+    def __len__(self):
+        return len(self.mass)
+
+    def bind(self, bodies, trajectory=None):
+        '''
+        Point each planet at read-only views of the state arrays, so they follow the simulation without copying
+        '''
+        for i, p in enumerate(bodies):
+            p.pos = _read_only(self.pos[i])
+            p.v = _read_only(self.v[i])
+            p.prev_as = _read_only(self.prev_as[:, i])
+            if trajectory is not None:
+                p.positions = _read_only(trajectory[:, i])
+
+
+def _read_only(view):
+    view.flags.writeable = False
+    return view
+
+
+class DirectForce:
+    '''
+    Direct-summation gravity kernel. Every pairwise acceleration is computed in one batched call, reusing
+    preallocated scratch arrays between calls. For large N the bodies are processed in blocks of rows, so the
+    scratch arrays never hold more than block_elements pairs. When all bodies fit in one block, the pair distances
+    of the last call are kept for potential_energy.
+    '''
+    def __init__(self, G, block_elements=2**22):
+        self.G = G
+        self.block_elements = block_elements
+        self._shape = None
+
+    def _allocate(self, n, n_sources):
+        self._shape = (n, n_sources)
+        rows = min(n, max(1, self.block_elements // max(n_sources, 1)))
+        self.diff = np.empty((rows, n_sources, 2)) # diff[i, j] is the vector from body i to source j
+        self.dist_sq = np.empty((rows, n_sources))
+        self.dist = np.empty((rows, n_sources))
+        self.weights = np.empty((rows, n_sources))
+        self._pos = np.full((n, 2), np.nan) # Positions of the last call, while dist holds all of its pairs
+
+    def __call__(self, pos, mass, n_sources=None):
+        '''
+        Returns the (N, 2) array of accelerations on every body due to the first n_sources bodies (by default all
+        of them); the remaining bodies are massless test particles
+        '''
+        n = len(pos)
+        n_sources = n if n_sources is None else n_sources
+        if (n, n_sources) != self._shape:
+            self._allocate(n, n_sources)
+        rows = len(self.diff)
+        if rows == n:
+            self._pos[:] = pos
+            return self._block(pos, mass, n_sources, 0, n)
+        acc = np.empty((n, 2))
+        for first in range(0, n, rows):
+            last = min(first + rows, n)
+            acc[first:last] = self._block(pos, mass, n_sources, first, last)
+        return acc
+
+    def _block(self, pos, mass, n_sources, first, last):
+        '''
+        Accelerations on bodies first to last - 1
+        '''
+        k = last - first
+        diff, dist_sq, dist, weights = self.diff[:k], self.dist_sq[:k], self.dist[:k], self.weights[:k]
+        np.subtract(pos[np.newaxis, :n_sources, :], pos[first:last, np.newaxis, :], out=diff)
+        np.einsum('ijk,ijk->ij', diff, diff, out=dist_sq)
+        # Remove self-interaction, on the rows of the block that are sources themselves
+        sources_in_block = max(0, min(k, n_sources - first))
+        dist_sq.flat[first:first + sources_in_block * (n_sources + 1):n_sources + 1] = np.inf
+        # weights[i, j] = m_j / r_ij^3
+        np.sqrt(dist_sq, out=dist)
+        np.multiply(dist, dist_sq, out=weights)
+        np.divide(mass[:n_sources], weights, out=weights)
+        return self.G * np.einsum('ij,ijk->ik', weights, diff)
+
+    def potential_energy(self, pos, mass, n_sources=None):
+        '''
+        Gravitational potential energy of the first n_sources bodies. If the last call was made at these same
+        positions, its pair distances are reused instead of being computed again.
+        '''
+        n_sources = len(pos) if n_sources is None else n_sources
+        if self._shape != (len(pos), n_sources) or not np.array_equal(self._pos, pos):
+            return potential_energy(pos[:n_sources], mass[:n_sources], self.G)
+        # Self-interaction distances are inf, so they add nothing; each pair is counted twice
+        masses = mass[:n_sources]
+        return -0.5 * self.G * np.dot(masses, np.divide(masses, self.dist[:n_sources]).sum(axis=1))
+
+
+# Gravity backends selectable by name in Simulation
+FORCE_BACKENDS = {
+    'direct': DirectForce,
+    'barnes-hut': BarnesHutForce,
+}
+
+
+def get_force_backend(name, G, **options):
+    '''
+    Build the gravity backend registered under name, passing any options (e.g. theta for Barnes-Hut)
+    '''
+    if name not in FORCE_BACKENDS:
+        raise ValueError(f"Unknown force backend '{name}', expected one of {sorted(FORCE_BACKENDS)}")
+    return FORCE_BACKENDS[name](G, **options)
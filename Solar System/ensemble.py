@@ -0,0 +1,184 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict, replace
+from multiprocessing import shared_memory
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+
+@dataclass
+class EnsembleMember:
+    '''
+    One run of an ensemble. body_overrides maps a body name to the parameters to change, e.g.
+    {'jupiter': {'mass': 320}}, and mass_perturbation is the relative standard deviation of random changes to every
+    mass, drawn from the member's seed.
+    '''
+    integration_method: str = 'beeman'
+    timestep: float = 0.001
+    num_steps: int = 1000
+    body_overrides: dict = field(default_factory=dict)
+    mass_perturbation: float = 0.0
+    record_stride: int = 100 # Trajectory recording stride
+    integrator_options: dict = field(default_factory=dict)
+    force: str = 'direct'
+    energy_every: int = 100 # Energy sampling cadence, in steps
+    max_energy_drift: float = None # Stop the member early once its relative energy drift exceeds this
+    seed: int = None # Derived from the config hash if not given
+
+    def config_hash(self, config):
+        '''
+        Hash of everything that determines the result: the member's settings and the base parameters
+        '''
+        settings = {'member': asdict(self), 'grav_const': config.grav_const, 'bodies': config.bodies}
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+    def seed_value(self, config):
+        return self.seed if self.seed is not None else int(self.config_hash(config)[:8], 16)
+
+    def shapes(self, config):
+        '''
+        Shapes of the energy log and of the recorded trajectory
+        '''
+        num_energies = len(range(0, self.num_steps, self.energy_every))
+        num_records = self.num_steps // self.record_stride + 1
+        return (num_energies, 2), (num_records, len(config.bodies), 2)
+
+    def bodies(self, config):
+        '''
+        The body parameters of this member, with overrides and seeded mass perturbations applied
+        '''
+        rng = np.random.default_rng(self.seed_value(config))
+        bodies = []
+        for p in config.bodies:
+            p = dict(p, **self.body_overrides.get(p['name'], {}))
+            if self.mass_perturbation:
+                p['mass'] *= 1 + self.mass_perturbation * rng.standard_normal()
+            bodies.append(p)
+        return bodies
+
+
+@dataclass
+class EnsembleResult:
+    member: EnsembleMember
+    config_hash: str
+    energy_log: np.ndarray # (samples, 2) array of time and total energy
+    trajectory: np.ndarray # (records, N, 2) array of positions, every record_stride steps
+    periods: np.ndarray # Orbital period of every body, nan where none was completed
+    run_time: float
+    cached: bool # Loaded from the cache rather than simulated
+    aborted: bool = False # Stopped by max_energy_drift; samples and records after the stop are nan
+
+
+class EnsembleResults(list):
+    '''
+    List of EnsembleResults whose arrays live in shared memory blocks; close() releases them
+    '''
+    def __init__(self, results, blocks):
+        super().__init__(results)
+        self._blocks = blocks
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _arrays(buffer, shapes):
+    '''
+    Energy log and trajectory arrays laid out one after the other in a buffer
+    '''
+    energy_shape, trajectory_shape = shapes
+    energy = np.ndarray(energy_shape, dtype=np.float64, buffer=buffer)
+    trajectory = np.ndarray(trajectory_shape, dtype=np.float64, buffer=buffer, offset=energy.nbytes)
+    return energy, trajectory
+
+
+def _run_member(member, config, block_name):
+    '''
+    Worker: simulate one member and write its energy log and trajectory into the shared memory block
+    '''
+    from solar_system import Simulation
+
+    member_config = replace(config, bodies=member.bodies(config), timestep=member.timestep,
+                            num_iterations=member.num_steps)
+    sim = Simulation.from_config(member_config, member.integration_method, record_stride=member.record_stride,
+                                 integrator_options=member.integrator_options, force=member.force, progress=False,
+                                 energy_every=member.energy_every, max_energy_drift=member.max_energy_drift)
+    planets = sim.bodies
+    start = time.perf_counter()
+    sim.simulate()
+    run_time = time.perf_counter() - start
+
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        energy, trajectory = _arrays(block.buf, member.shapes(config))
+        energy[:] = np.nan
+        trajectory[:] = np.nan
+        energy[:len(sim.energy_log)] = np.array(sim.energy_log, dtype=np.float64).reshape(-1, 2)
+        trajectory[:sim.trajectory.count] = sim.trajectory.positions[:sim.trajectory.count]
+        del energy, trajectory # Release the views before closing the block
+    finally:
+        block.close()
+    periods = np.array([np.nan if p.orbital_period is None else p.orbital_period for p in planets])
+    return periods, run_time, sim.aborted
+
+
+def run_ensemble(members, config, processes=None, cache_dir=None):
+    '''
+    Run every member, each a variation of the SimulationConfig config, across a pool of processes. Each member's
+    energy log and trajectory are written by the worker straight into a shared memory block, which the returned
+    EnsembleResults expose without copying; call close() (or use it as a context manager) to free them. With a
+    cache_dir, results are saved under the member's config hash and reused by later invocations instead of being
+    simulated again.
+    '''
+    results, blocks, pending = [None] * len(members), [], {}
+    try:
+        for i, member in enumerate(members):
+            key = member.config_hash(config)
+            cached = os.path.join(cache_dir, f'{key}.npz') if cache_dir is not None else None
+            if cached is not None and os.path.exists(cached):
+                with np.load(cached) as saved:
+                    results[i] = EnsembleResult(member, key, saved['energy_log'], saved['trajectory'], saved['periods'],
+                                                float(saved['run_time']), cached=True, aborted=bool(saved['aborted']))
+                continue
+            shapes = member.shapes(config)
+            size = sum(int(np.prod(shape)) for shape in shapes) * np.dtype(np.float64).itemsize
+            block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            blocks.append(block)
+            pending[i] = (key, block, shapes)
+
+        if pending:
+            if processes == 1:
+                outcomes = {i: _run_member(members[i], config, block.name)
+                            for i, (key, block, shapes) in pending.items()}
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    futures = {i: pool.submit(_run_member, members[i], config, block.name)
+                               for i, (key, block, shapes) in pending.items()}
+                    outcomes = {i: future.result() for i, future in futures.items()}
+            for i, (key, block, shapes) in pending.items():
+                periods, run_time, aborted = outcomes[i]
+                energy, trajectory = _arrays(block.buf, shapes)
+                results[i] = EnsembleResult(members[i], key, energy, trajectory, periods, run_time, cached=False,
+                                            aborted=aborted)
+                if cache_dir is not None:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    np.savez(os.path.join(cache_dir, f'{key}.npz'), energy_log=energy, trajectory=trajectory,
+                             periods=periods, run_time=run_time, aborted=aborted)
+    except BaseException:
+        # A failed worker (or cache write) must not leave its blocks behind in shared memory until reboot
+        results = energy = trajectory = None # Release the views before closing the blocks
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+    return EnsembleResults(results, blocks)
@@ -0,0 +1,327 @@
+import numpy as np
+from profiling import NULL_PROFILER
+
+# Registry of integration schemes for the vectorized engine, keyed by the name given as a planet's
+# integration_method. Add a scheme by subclassing Integrator and decorating it with @register_integrator(name).
+INTEGRATORS = {}
+
+
+def register_integrator(name):
+    def decorator(cls):
+        cls.name = name
+        INTEGRATORS[name] = cls
+        return cls
+    return decorator
+
+
+def get_integrator(name, **options):
+    '''
+    Build the integrator registered under name, passing any options to its constructor
+    '''
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integration method '{name}', expected one of {sorted(INTEGRATORS)}")
+    return INTEGRATORS[name](**options)
+
+
+class Integrator:
+    '''
+    Base class for integrators acting on a whole SystemState at once. forces(pos, mass, n_sources) returns the
+    (N, 2) accelerations due to the first n_sources bodies, the massive ones. prev_as[1] holds the acceleration at
+    the current positions between steps, so schemes that need it can carry it over instead of evaluating the forces
+    twice.
+    '''
+    name = None
+    order = None # Global order of accuracy
+    symplectic = False
+    adaptive = False # Adaptive schemes choose their own internal steps and record them in step_sizes
+    profiler = NULL_PROFILER # Times the 'position' and 'velocity' phases of each step, see profiling.Profiler
+
+    def start(self, state, forces):
+        '''
+        Prepare for the first step
+        '''
+        state.prev_as[1] = forces(state.pos, state.mass, state.n_massive)
+
+    def step(self, state, forces, dt):
+        raise NotImplementedError
+
+    def state_dict(self):
+        '''
+        Any internal state beyond the SystemState, saved in checkpoints
+        '''
+        return {}
+
+    def load_state_dict(self, saved):
+        pass
+
+
+@register_integrator('beeman')
+class Beeman(Integrator):
+    order = 3
+
+    def step(self, state, forces, dt):
+        a_prev, a_curr = state.prev_as
+        with self.profiler.phase('position'):
+            state.pos += state.v * dt + 1/6 * dt**2 * (4 * a_curr - a_prev)
+        new_a = forces(state.pos, state.mass, state.n_massive)
+        with self.profiler.phase('velocity'):
+            state.v += 1/6 * dt * (2 * new_a + 5 * a_curr - a_prev)
+            state.prev_as[0] = a_curr
+            state.prev_as[1] = new_a
+
+
+@register_integrator('euler-cromer')
+class EulerCromer(Integrator):
+    order = 1
+    symplectic = True
+
+    def step(self, state, forces, dt):
+        with self.profiler.phase('velocity'):
+            state.v += state.prev_as[1] * dt
+        with self.profiler.phase('position'):
+            state.pos += state.v * dt
+        state.prev_as[1] = forces(state.pos, state.mass, state.n_massive)
+
+
+@register_integrator('direct-euler')
+class DirectEuler(Integrator):
+    order = 1
+
+    def step(self, state, forces, dt):
+        with self.profiler.phase('position'):
+            state.pos += state.v * dt
+        with self.profiler.phase('velocity'):
+            state.v += state.prev_as[1] * dt
+        state.prev_as[1] = forces(state.pos, state.mass, state.n_massive)
+
+
+@register_integrator('leapfrog')
+class Leapfrog(Integrator):
+    '''
+    Velocity Verlet (kick-drift-kick leapfrog)
+    '''
+    order = 2
+    symplectic = True
+
+    def step(self, state, forces, dt):
+        phase = self.profiler.phase
+        with phase('velocity'):
+            state.v += 0.5 * dt * state.prev_as[1]
+        with phase('position'):
+            state.pos += state.v * dt
+        state.prev_as[1] = forces(state.pos, state.mass, state.n_massive)
+        with phase('velocity'):
+            state.v += 0.5 * dt * state.prev_as[1]
+
+
+@register_integrator('yoshida4')
+class Yoshida4(Leapfrog):
+    '''
+    Yoshida's fourth-order method: three leapfrog substeps of dt*w1, dt*w0, dt*w1
+    '''
+    order = 4
+    w1 = 1 / (2 - 2**(1/3))
+    w0 = -2**(1/3) / (2 - 2**(1/3))
+
+    def step(self, state, forces, dt):
+        for weight in (self.w1, self.w0, self.w1):
+            super().step(state, forces, weight * dt)
+
+
+def kepler_drift(Q, u, mu, dt, tolerance=1e-15, max_iterations=50):
+    '''
+    Advance bound Keplerian orbits about a fixed centre by dt using Gauss' f and g functions. Q and u are (N, 2)
+    relative positions and velocities, and Kepler's equation in the change of eccentric anomaly is solved by
+    Newton iteration for all bodies at once.
+    '''
+    r0 = np.sqrt(np.einsum('ij,ij->i', Q, Q))
+    v0_sq = np.einsum('ij,ij->i', u, u)
+    alpha = 2 / r0 - v0_sq / mu # 1 / semi-major axis
+    if np.any(alpha <= 0):
+        raise ValueError("Kepler drift needs bound orbits about the central body")
+    a = 1 / alpha
+    n = np.sqrt(mu * alpha**3) # Mean motion
+    e_cos = 1 - r0 * alpha # e cos(E0)
+    e_sin = np.einsum('ij,ij->i', Q, u) / np.sqrt(mu * a) # e sin(E0)
+
+    M = n * dt
+    dE = M.copy()
+    for _ in range(max_iterations):
+        sin_dE, cos_dE = np.sin(dE), np.cos(dE)
+        f = dE - e_cos * sin_dE + e_sin * (1 - cos_dE) - M
+        fp = 1 - e_cos * cos_dE + e_sin * sin_dE
+        correction = f / fp
+        dE -= correction
+        if np.all(np.abs(correction) < tolerance):
+            break
+    sin_dE, cos_dE = np.sin(dE), np.cos(dE)
+    r = a * (1 - e_cos * cos_dE + e_sin * sin_dE)
+
+    f = 1 - a / r0 * (1 - cos_dE)
+    g = dt - (dE - sin_dE) / n
+    fdot = -np.sqrt(mu * a) * sin_dE / (r * r0)
+    gdot = 1 - a / r * (1 - cos_dE)
+    return f[:, None] * Q + g[:, None] * u, fdot[:, None] * Q + gdot[:, None] * u
+
+
+@register_integrator('wisdom-holman')
+class WisdomHolman(Integrator):
+    '''
+    Wisdom-Holman map in democratic heliocentric coordinates, for systems dominated by one central body, the
+    first body (the sun). Each step is a half kick from the planet-planet interactions, a half drift from the sun's
+    motion, an exact Keplerian drift of every planet about the sun, then the two half steps again in reverse.
+    '''
+    order = 2
+    symplectic = True
+
+    def start(self, state, forces):
+        super().start(state, forces)
+        if np.argmax(state.mass) != 0:
+            raise ValueError("The Wisdom-Holman map needs the first body to be the most massive")
+
+    def step(self, state, forces, dt):
+        mass, m_c = state.mass[1:], state.mass[0]
+        total_mass = state.mass.sum()
+        mu = forces.G * m_c
+
+        # Democratic heliocentric coordinates: positions relative to the central body, barycentric velocities
+        x_cm = state.mass @ state.pos / total_mass
+        v_cm = state.mass @ state.v / total_mass
+        Q = state.pos[1:] - state.pos[0]
+        u = state.v[1:] - v_cm
+
+        n_planets = state.n_massive - 1
+        phase = self.profiler.phase
+        kick = forces(Q, mass, n_planets)
+        with phase('velocity'):
+            u += 0.5 * dt * kick # Interaction kick
+        with phase('position'):
+            Q += 0.5 * dt * (mass @ u) / m_c # Drift from the central body's momentum
+            Q, u = kepler_drift(Q, u, mu, dt)
+            Q += 0.5 * dt * (mass @ u) / m_c
+        kick = forces(Q, mass, n_planets)
+        with phase('velocity'):
+            u += 0.5 * dt * kick
+
+        # Back to barycentric positions and velocities; the centre of mass moves uniformly
+        x_cm = x_cm + v_cm * dt
+        state.pos[0] = x_cm - mass @ Q / total_mass
+        state.pos[1:] = Q + state.pos[0]
+        state.v[1:] = u + v_cm
+        state.v[0] = v_cm - mass @ u / m_c
+
+
+def hermite_interpolate(s, h, x0, v0, a0, x1, v1, a1):
+    '''
+    Quintic Hermite interpolation between two points of a trajectory, matching position, velocity and acceleration
+    at both ends. s in [0, 1] is the fraction of the step h. Returns the interpolated position and velocity.
+    '''
+    s2, s3, s4, s5 = s**2, s**3, s**4, s**5
+    x = ((1 - 10*s3 + 15*s4 - 6*s5) * x0 + (s - 6*s3 + 8*s4 - 3*s5) * h * v0
+         + (0.5*s2 - 1.5*s3 + 1.5*s4 - 0.5*s5) * h**2 * a0 + (0.5*s3 - s4 + 0.5*s5) * h**2 * a1
+         + (-4*s3 + 7*s4 - 3*s5) * h * v1 + (10*s3 - 15*s4 + 6*s5) * x1)
+    v = ((-30*s2 + 60*s3 - 30*s4) * x0 / h + (1 - 18*s2 + 32*s3 - 15*s4) * v0
+         + (s - 4.5*s2 + 6*s3 - 2.5*s4) * h * a0 + (1.5*s2 - 4*s3 + 2.5*s4) * h * a1
+         + (-12*s2 + 28*s3 - 15*s4) * v1 + (30*s2 - 60*s3 + 30*s4) * x1 / h)
+    return x, v
+
+
+@register_integrator('dopri5')
+class DormandPrince54(Integrator):
+    '''
+    Adaptive embedded Runge-Kutta 5(4) of Dormand and Prince. Each call to step() advances the state by the
+    requested dt: internal steps grow and shrink to keep the estimated local error below the tolerance, and the
+    state at the requested time is found by dense (quintic Hermite) interpolation, so output stays on a fixed grid.
+    '''
+    order = 5
+    adaptive = True
+    A = np.array([
+        [0, 0, 0, 0, 0, 0],
+        [1/5, 0, 0, 0, 0, 0],
+        [3/40, 9/40, 0, 0, 0, 0],
+        [44/45, -56/15, 32/9, 0, 0, 0],
+        [19372/6561, -25360/2187, 64448/6561, -212/729, 0, 0],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656, 0],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+    ])
+    B5 = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0]) # Fifth-order weights (the last row of A)
+    B4 = np.array([5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40]) # Embedded fourth order
+
+    def __init__(self, tolerance=1e-11, initial_step=None, safety=0.9, min_factor=0.2, max_factor=5.0):
+        self.tolerance = tolerance # Absolute and relative tolerance on positions and velocities
+        self.h = initial_step # Internal step size, the output spacing if not given
+        self.safety = safety
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.step_sizes = [] # Every accepted internal step
+        self.rejected = 0
+        self.force_evaluations = 0
+
+    def start(self, state, forces):
+        super().start(state, forces)
+        self.force_evaluations += 1
+        self.t = 0.0 # Time of the last accepted internal step, from the start of the run
+        self.t_out = 0.0 # Time of the state last handed out
+        self.current = (state.pos.copy(), state.v.copy(), state.prev_as[1].copy())
+        self.previous = None
+        self.t_previous = 0.0
+
+    def step(self, state, forces, dt):
+        if self.h is None:
+            self.h = dt
+        target = self.t_out + dt
+        while self.t < target:
+            self._internal_step(forces, state.mass, state.n_massive)
+        # The last internal step spans the target time: interpolate to it
+        h = self.t - self.t_previous
+        s = (target - self.t_previous) / h
+        state.pos[:], state.v[:] = hermite_interpolate(s, h, *self.previous, *self.current)
+        self.t_out = target
+
+    def _internal_step(self, forces, mass, n_sources):
+        x, v, a = self.current
+        n = len(mass)
+        while True:
+            h = self.h
+            kx = np.empty((7, n, 2)) # Stage derivatives of position (velocities)
+            kv = np.empty((7, n, 2)) # and of velocity (accelerations)
+            kx[0], kv[0] = v, a
+            for i in range(1, 7):
+                kx[i] = v + h * np.tensordot(self.A[i, :i], kv[:i], axes=1)
+                kv[i] = forces(x + h * np.tensordot(self.A[i, :i], kx[:i], axes=1), mass, n_sources)
+            self.force_evaluations += 6
+            # Stage 7 is evaluated at the fifth-order solution, so it is also the first stage of the next step
+            new_x = x + h * np.tensordot(self.B5, kx, axes=1)
+            new_v = kx[6]
+            error_x = h * np.tensordot(self.B5 - self.B4, kx, axes=1)
+            error_v = h * np.tensordot(self.B5 - self.B4, kv, axes=1)
+            scale_x = self.tolerance * (1 + np.maximum(np.abs(x), np.abs(new_x)))
+            scale_v = self.tolerance * (1 + np.maximum(np.abs(v), np.abs(new_v)))
+            error = np.sqrt(0.5 * (np.mean((error_x / scale_x)**2) + np.mean((error_v / scale_v)**2)))
+
+            factor = self.max_factor if error == 0 else self.safety * error**-0.2
+            factor = min(self.max_factor, max(self.min_factor, factor))
+            if error <= 1:
+                self.previous, self.t_previous = self.current, self.t
+                self.current = (new_x, new_v, kv[6])
+                self.t += h
+                self.step_sizes.append(h)
+                self.h = h * factor
+                return
+            self.rejected += 1
+            self.h = h * min(1, factor)
+
+    def state_dict(self):
+        x, v, a = self.current
+        saved = {'t': self.t, 't_out': self.t_out, 'h': self.h, 'x': x, 'v': v, 'a': a, 't_previous': self.t_previous}
+        if self.previous is not None:
+            saved.update(previous_x=self.previous[0], previous_v=self.previous[1], previous_a=self.previous[2])
+        return saved
+
+    def load_state_dict(self, saved):
+        self.t, self.t_out, self.h = float(saved['t']), float(saved['t_out']), float(saved['h'])
+        self.t_previous = float(saved['t_previous'])
+        self.current = (np.array(saved['x']), np.array(saved['v']), np.array(saved['a']))
+        self.previous = None
+        if 'previous_x' in saved:
+            self.previous = (np.array(saved['previous_x']), np.array(saved['previous_v']), np.array(saved['previous_a']))
@@ -0,0 +1,137 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError: # Numba is optional; without it Simulation(engine='numba') falls back to the NumPy engine
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+def _jit(function):
+    return numba.njit(cache=True)(function) if NUMBA_AVAILABLE else function
+
+
+@_jit
+def accelerations(pos, mass, n_sources, G, out):
+    '''
+    Direct-summation accelerations on every body due to the first n_sources bodies, written into out (N, 2). Each
+    pair of sources is visited once and acts on both bodies, halving the square roots.
+    '''
+    out[:] = 0.0
+    for i in range(n_sources):
+        for j in range(i + 1, n_sources):
+            dx = pos[j, 0] - pos[i, 0]
+            dy = pos[j, 1] - pos[i, 1]
+            r_sq = dx * dx + dy * dy
+            inv_r3 = 1.0 / (r_sq * np.sqrt(r_sq))
+            out[i, 0] += mass[j] * inv_r3 * dx
+            out[i, 1] += mass[j] * inv_r3 * dy
+            out[j, 0] -= mass[i] * inv_r3 * dx
+            out[j, 1] -= mass[i] * inv_r3 * dy
+    # Massless test particles only feel the sources
+    for i in range(n_sources, len(pos)):
+        for j in range(n_sources):
+            dx = pos[j, 0] - pos[i, 0]
+            dy = pos[j, 1] - pos[i, 1]
+            r_sq = dx * dx + dy * dy
+            weight = mass[j] / (r_sq * np.sqrt(r_sq))
+            out[i, 0] += weight * dx
+            out[i, 1] += weight * dy
+    for i in range(len(pos)):
+        out[i, 0] *= G
+        out[i, 1] *= G
+
+
+@_jit
+def diagnostics(pos, v, mass, n_massive, G, time, out):
+    '''
+    Write a row of diagnostics.DIAGNOSTIC_FIELDS for the massive bodies into out: the time, kinetic, potential and
+    total energy, and angular momentum
+    '''
+    kinetic = 0.0
+    potential = 0.0
+    momentum = 0.0
+    for i in range(n_massive):
+        kinetic += 0.5 * mass[i] * (v[i, 0] * v[i, 0] + v[i, 1] * v[i, 1])
+        momentum += mass[i] * (pos[i, 0] * v[i, 1] - pos[i, 1] * v[i, 0])
+        for j in range(i + 1, n_massive):
+            dx = pos[i, 0] - pos[j, 0]
+            dy = pos[i, 1] - pos[j, 1]
+            potential -= G * mass[i] * mass[j] / np.sqrt(dx * dx + dy * dy)
+    out[0] = time
+    out[1] = kinetic
+    out[2] = potential
+    out[3] = kinetic + potential
+    out[4] = momentum
+
+
+@_jit
+def beeman_block(pos, v, prev_as, mass, n_sources, G, dt, first, last, stride, records, energy_every, energies,
+                 energy0, max_drift):
+    '''
+    Take Beeman steps first to last - 1 in place on the state arrays. After each step the positions are written to
+    records[(step + 1) // stride] when the step falls on the recording stride, and a row of diagnostics is appended
+    to energies every energy_every steps. If the total energy drifts from energy0 (nan for the first sample written)
+    by more than max_drift (relative), the block stops early. Returns the number of rows written and the number of
+    steps taken in total.
+    '''
+    n = len(pos)
+    new_a = np.empty((n, 2))
+    logged = 0
+    for step in range(first, last):
+        for i in range(n):
+            for k in range(2):
+                pos[i, k] += v[i, k] * dt + 1/6 * dt**2 * (4 * prev_as[1, i, k] - prev_as[0, i, k])
+        accelerations(pos, mass, n_sources, G, new_a)
+        for i in range(n):
+            for k in range(2):
+                v[i, k] += 1/6 * dt * (2 * new_a[i, k] + 5 * prev_as[1, i, k] - prev_as[0, i, k])
+                prev_as[0, i, k] = prev_as[1, i, k]
+                prev_as[1, i, k] = new_a[i, k]
+        if (step + 1) % stride == 0:
+            records[(step + 1) // stride] = pos
+        if step % energy_every == 0:
+            diagnostics(pos, v, mass, n_sources, G, step * dt, energies[logged])
+            logged += 1
+            if np.isnan(energy0): # The first sample of the run is the reference
+                energy0 = energies[0, 3]
+            if abs(energies[logged - 1, 3] / energy0 - 1) > max_drift:
+                return logged, step + 1
+    return logged, last
+
+
+@_jit
+def leapfrog_block(pos, v, prev_as, mass, n_sources, G, dt, first, last, stride, records, energy_every, energies,
+                   energy0, max_drift):
+    '''
+    The same as beeman_block, with velocity Verlet (kick-drift-kick) steps
+    '''
+    n = len(pos)
+    logged = 0
+    for step in range(first, last):
+        for i in range(n):
+            for k in range(2):
+                v[i, k] += 0.5 * dt * prev_as[1, i, k]
+                pos[i, k] += v[i, k] * dt
+        accelerations(pos, mass, n_sources, G, prev_as[1])
+        for i in range(n):
+            for k in range(2):
+                v[i, k] += 0.5 * dt * prev_as[1, i, k]
+        if (step + 1) % stride == 0:
+            records[(step + 1) // stride] = pos
+        if step % energy_every == 0:
+            diagnostics(pos, v, mass, n_sources, G, step * dt, energies[logged])
+            logged += 1
+            if np.isnan(energy0): # The first sample of the run is the reference
+                energy0 = energies[0, 3]
+            if abs(energies[logged - 1, 3] / energy0 - 1) > max_drift:
+                return logged, step + 1
+    return logged, last
+
+
+# Compiled block kernels, keyed by integration method
+BLOCK_KERNELS = {
+    'beeman': beeman_block,
+    'leapfrog': leapfrog_block,
+}
@@ -0,0 +1,198 @@
+import os
+import glob
+import json
+import numpy as np
+
+
+class ChunkedOutput:
+    '''
+    Streams the trajectory, energy log and diagnostics of a Simulation to a directory of .npy segments while it runs, and
+    writes a checkpoint of the full integrator state every time segments are flushed, so an interrupted run can
+    be resumed bit-identically from its last checkpoint.
+    '''
+    def __init__(self, directory, chunk_size=10000, stride=1, checkpoint_every=1):
+        self.directory = directory
+        self.chunk_size = chunk_size # Number of position records per segment
+        self.stride = stride # Record positions every `stride` steps
+        self.checkpoint_every = checkpoint_every # Write a checkpoint every `checkpoint_every` segments
+        self.dt = None
+        self.num_chunks = 0 # Segments written so far
+        self._positions = None # Buffer for the current segment, allocated in start()
+        self._count = 0
+        self._energies = []
+        self._diagnostics = []
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def start(self, sim, state):
+        '''
+        Prepare the directory for a fresh run, removing any output from a previous one
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_segments(0)
+        if os.path.exists(self._path('checkpoint.npz')):
+            os.remove(self._path('checkpoint.npz'))
+        metadata = {'names': state.names, 'dt': sim.dt, 'num_steps': sim.num_steps, 'stride': self.stride,
+                    'chunk_size': self.chunk_size}
+        with open(self._path('metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=4)
+        self.dt = sim.dt
+        self.num_chunks = 0
+        self._allocate(len(state))
+
+    def can_resume(self):
+        return os.path.exists(self._path('checkpoint.npz'))
+
+    def resume(self, sim, state):
+        '''
+        Load the last checkpoint into the state arrays and discard anything written after it. Returns the number
+        of steps already taken and the dictionary of extra arrays saved with the checkpoint.
+        '''
+        with np.load(self._path('checkpoint.npz')) as checkpoint:
+            if list(checkpoint['names']) != state.names or checkpoint['dt'] != sim.dt:
+                raise ValueError(f"Checkpoint in {self.directory} was written by a different simulation")
+            state.pos[:] = checkpoint['pos']
+            state.v[:] = checkpoint['v']
+            state.prev_as[:] = checkpoint['prev_as']
+            step = int(checkpoint['step'])
+            self.num_chunks = int(checkpoint['num_chunks'])
+            extra = {key[len('extra_'):]: checkpoint[key] for key in checkpoint.files if key.startswith('extra_')}
+        self.dt = sim.dt
+        self._remove_segments(self.num_chunks)
+        sim.energy_log = [tuple(row) for row in self.load_energy_log()]
+        sim.diagnostics = [tuple(row) for row in self.load_diagnostics()]
+        self._allocate(len(state))
+        return step, extra
+
+    def _allocate(self, n_bodies):
+        self._positions = np.empty((self.chunk_size, n_bodies, 2), dtype=np.float64)
+        self._count = 0
+        self._energies = []
+        self._diagnostics = []
+
+    def _remove_segments(self, first):
+        for path in self._segments('positions') + self._segments('energy') + self._segments('diagnostics'):
+            index = os.path.splitext(os.path.basename(path))[0].rsplit('_', 1)[1]
+            if int(index) >= first:
+                os.remove(path)
+
+    def _segments(self, kind):
+        return sorted(glob.glob(self._path(f'{kind}_*.npy')))
+
+    def record(self, step, pos):
+        '''
+        Buffer the (N, 2) positions after `step` steps, if the step falls on the recording stride
+        '''
+        if step % self.stride == 0:
+            self._positions[self._count] = pos
+            self._count += 1
+
+    def log_energy(self, time, energy):
+        self._energies.append((time, energy))
+
+    def log_diagnostics(self, row):
+        '''
+        Buffer a row of the simulation's diagnostics, (time, kinetic, potential, total, angular momentum)
+        '''
+        self._diagnostics.append(row)
+
+    def end_step(self, step, state, extra=None):
+        '''
+        Called once a step is complete: flush the segment when it is full, and checkpoint on the flush cadence.
+        extra is a function returning the extra arrays to checkpoint, only called when a checkpoint is written.
+        '''
+        if self._count == self.chunk_size:
+            self.flush()
+            if self.num_chunks % self.checkpoint_every == 0:
+                self.checkpoint(step, state, extra() if extra is not None else None)
+
+    def flush(self):
+        '''
+        Write the buffered positions, energies and diagnostics as the next set of segments
+        '''
+        if self._count == 0 and not self._energies:
+            return
+        np.save(self._path(f'positions_{self.num_chunks:05d}.npy'), self._positions[:self._count])
+        np.save(self._path(f'energy_{self.num_chunks:05d}.npy'), np.array(self._energies, dtype=np.float64).reshape(-1, 2))
+        np.save(self._path(f'diagnostics_{self.num_chunks:05d}.npy'),
+                np.array(self._diagnostics, dtype=np.float64).reshape(-1, 5))
+        self.num_chunks += 1
+        self._count = 0
+        self._energies = []
+        self._diagnostics = []
+
+    def checkpoint(self, step, state, extra=None):
+        '''
+        Save the full integrator state, plus any extra arrays (e.g. online trackers), replacing the previous
+        checkpoint atomically
+        '''
+        extra = {f'extra_{key}': value for key, value in (extra or {}).items()}
+        temporary = self._path('checkpoint.tmp.npz')
+        with open(temporary, 'wb') as f:
+            np.savez(f, pos=state.pos, v=state.v, prev_as=state.prev_as, step=step, num_chunks=self.num_chunks,
+                     names=np.array(state.names), dt=self.dt, **extra)
+        os.replace(temporary, self._path('checkpoint.npz'))
+
+    def close(self, step, state, extra=None):
+        '''
+        Flush whatever is left and write a final checkpoint
+        '''
+        self.flush()
+        self.checkpoint(step, state, extra)
+
+    def load_trajectory(self, mmap_mode=None):
+        '''
+        The position segments as one (records, N, 2) trajectory. By default they are concatenated into an array in
+        memory; with a mmap_mode (e.g. 'r') a SegmentedTrajectory is returned instead, which maps each segment only
+        while it is read, so the run never has to fit in memory.
+        '''
+        if mmap_mode is not None:
+            return SegmentedTrajectory(self._segments('positions'), mmap_mode)
+        segments = [np.load(path) for path in self._segments('positions')]
+        return np.concatenate(segments) if segments else np.empty((0, 0, 2))
+
+    def load_energy_log(self):
+        segments = [np.load(path) for path in self._segments('energy')]
+        return np.concatenate(segments) if segments else np.empty((0, 2))
+
+    def load_diagnostics(self):
+        '''
+        Concatenate the diagnostics segments into one (samples, 5) array, empty for output written without them
+        '''
+        segments = [np.load(path) for path in self._segments('diagnostics')]
+        return np.concatenate(segments) if segments else np.empty((0, 5))
+
+
+class SegmentedTrajectory:
+    '''
+    A (records, N, 2) trajectory stored as consecutive .npy segments, read lazily: segments() maps one segment at a
+    time, and indexing a record (trajectory[i] or trajectory[i, bodies]) maps only the segment holding it
+    '''
+    def __init__(self, paths, mmap_mode='r'):
+        self.paths = list(paths)
+        self.mmap_mode = mmap_mode
+        lengths = [len(np.load(path, mmap_mode='r')) for path in self.paths] # Reads the headers only
+        self.offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def segments(self):
+        '''
+        Every segment in order, as (index of its first record, memory-mapped array)
+        '''
+        for offset, path in zip(self.offsets, self.paths):
+            yield int(offset), np.load(path, mmap_mode=self.mmap_mode)
+
+    def __getitem__(self, key):
+        record, rest = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        if not isinstance(record, (int, np.integer)):
+            raise TypeError("A SegmentedTrajectory is indexed one record at a time; iterate over segments() instead")
+        if record < 0:
+            record += len(self)
+        if not 0 <= record < len(self):
+            raise IndexError(f"Record {record} is out of range for a trajectory of {len(self)} records")
+        index = int(np.searchsorted(self.offsets, record, side='right') - 1)
+        segment = np.load(self.paths[index], mmap_mode=self.mmap_mode)
+        return np.array(segment[(record - self.offsets[index],) + rest])
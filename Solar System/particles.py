@@ -0,0 +1,41 @@
+import math
+import numpy as np
+
+
+class TestParticles:
+    '''
+    A population of massless bodies (asteroids, comets, spacecraft) stored as compact (M, 2) arrays. They feel the
+    gravity of the massive bodies but exert none, so each step costs O(N_massive x M) rather than O((N + M)^2).
+    '''
+    def __init__(self, names, pos, v):
+        self.names = list(names)
+        self.pos = np.array(pos, dtype=np.float64).reshape(-1, 2)
+        self.v = np.array(v, dtype=np.float64).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.pos)
+
+    @classmethod
+    def from_config(cls, entries, G, sun_mass):
+        '''
+        Build the particles from the optional "test_particles" section of the parameters file. Each entry is either
+        a single particle, {"name", "orbital_radius", "angle"}, or a ring population drawn at random,
+        {"name", "count", "min_radius", "max_radius", "seed"}. Angles are in degrees, and every particle starts on
+        a circular orbit about the sun.
+        '''
+        names, radii, angles = [], [], []
+        for entry in entries:
+            if 'count' in entry:
+                rng = np.random.default_rng(entry.get('seed'))
+                names += [f"{entry['name']} {i}" for i in range(entry['count'])]
+                radii += list(rng.uniform(entry['min_radius'], entry['max_radius'], entry['count']))
+                angles += list(rng.uniform(0, 2 * np.pi, entry['count']))
+            else:
+                names.append(entry['name'])
+                radii.append(entry['orbital_radius'])
+                angles.append(math.radians(entry.get('angle', 0.0)))
+        radii, angles = np.array(radii, dtype=np.float64), np.array(angles, dtype=np.float64)
+        speeds = np.sqrt(G * sun_mass / radii)
+        pos = np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=1)
+        v = np.stack([-speeds * np.sin(angles), speeds * np.cos(angles)], axis=1)
+        return cls(names, pos, v)
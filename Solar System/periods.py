@@ -0,0 +1,87 @@
+import numpy as np
+
+
+def _wrap(angle):
+    '''
+    Wrap angles into [-pi, pi)
+    '''
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def orbital_periods(positions, sample_dt, sun_index=0):
+    '''
+    Find the orbital period of every body from recorded positions of shape (records, N, 2), in one vectorized pass.
+    As in Planet.check_orbital_period, positions are taken relative to the sun at each record to account for its
+    wobble, and the period is the first time the total angle swept about the sun reaches 2pi. The crossing is
+    interpolated between records. Returns an (N,) array with nan for the sun and for incomplete orbits.
+    '''
+    positions = np.asarray(positions)
+    relative = positions - positions[:, sun_index:sun_index + 1]
+    angles = np.unwrap(np.arctan2(relative[..., 1], relative[..., 0]), axis=0)
+    # Total angle swept, matching the sum of per-step angles from the original arccos method
+    swept = np.zeros_like(angles)
+    np.cumsum(np.abs(np.diff(angles, axis=0)), axis=0, out=swept[1:])
+
+    periods = np.full(positions.shape[1], np.nan)
+    passed = swept >= 2 * np.pi
+    completed = passed.any(axis=0)
+    completed[sun_index] = False
+    bodies = np.flatnonzero(completed)
+    crossing = passed[:, bodies].argmax(axis=0) # First record at or beyond 2pi
+    before, after = swept[crossing - 1, bodies], swept[crossing, bodies]
+    periods[bodies] = (crossing - 1 + (2 * np.pi - before) / (after - before)) * sample_dt
+    return periods
+
+
+class OrbitalPeriodTracker:
+    '''
+    Online version of orbital_periods, updated with the (N, 2) positions as a simulation runs so that periods are
+    found without keeping the position history.
+    '''
+    def __init__(self, n_bodies, sun_index=0):
+        self.sun_index = sun_index
+        self.prev_angle = np.zeros(n_bodies)
+        self.swept = np.zeros(n_bodies)
+        self.prev_time = 0.0
+        self.periods = np.full(n_bodies, np.nan)
+        self.searching = np.ones(n_bodies, dtype=bool) # Bodies still to complete an orbit
+        self.searching[sun_index] = False
+
+    def _angles(self, pos):
+        relative = pos - pos[self.sun_index]
+        return np.arctan2(relative[:, 1], relative[:, 0])
+
+    def start(self, pos, time=0.0):
+        self.prev_angle = self._angles(pos)
+        self.prev_time = time
+
+    @property
+    def done(self):
+        return not self.searching.any()
+
+    def update(self, pos, time):
+        '''
+        Add the angle swept since the last update. Updates must be frequent enough for each body to move less than
+        pi about the sun in between.
+        '''
+        angle = self._angles(pos)
+        swept = self.swept + np.abs(_wrap(angle - self.prev_angle))
+        crossed = self.searching & (swept >= 2 * np.pi)
+        if crossed.any():
+            fraction = (2 * np.pi - self.swept[crossed]) / (swept[crossed] - self.swept[crossed])
+            self.periods[crossed] = self.prev_time + fraction * (time - self.prev_time)
+            self.searching &= ~crossed
+        self.swept = swept
+        self.prev_angle = angle
+        self.prev_time = time
+
+    def state_dict(self):
+        return {'prev_angle': self.prev_angle, 'swept': self.swept, 'prev_time': self.prev_time,
+                'periods': self.periods, 'searching': self.searching}
+
+    def load_state_dict(self, state):
+        self.prev_angle = np.array(state['prev_angle'])
+        self.swept = np.array(state['swept'])
+        self.prev_time = float(state['prev_time'])
+        self.periods = np.array(state['periods'])
+        self.searching = np.array(state['searching'])
@@ -0,0 +1,141 @@
+from contextlib import nullcontext
+import time
+import tracemalloc
+
+# Phases timed by the vectorized engine; anything else in the step loop is reported as 'other'
+PHASES = ('force', 'position', 'velocity', 'energy', 'record')
+
+
+class _Phase:
+    '''
+    Context manager accumulating the wall time, number of calls and allocations of one phase
+    '''
+    __slots__ = ('track_memory', 'calls', 'seconds', 'allocated_bytes', 'peak_bytes', '_start', '_memory')
+
+    def __init__(self, track_memory):
+        self.track_memory = track_memory
+        self.calls = 0
+        self.seconds = 0.0
+        self.allocated_bytes = 0 # Sum over calls of the memory allocated on top of what was in use at the start
+        self.peak_bytes = 0 # Largest such allocation in a single call
+        self._start = 0.0
+        self._memory = 0
+
+    def __enter__(self):
+        if self.track_memory:
+            self._memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self._start
+        self.calls += 1
+        if self.track_memory:
+            allocated = tracemalloc.get_traced_memory()[1] - self._memory
+            self.allocated_bytes += allocated
+            self.peak_bytes = max(self.peak_bytes, allocated)
+        return False
+
+    def result(self):
+        result = {'calls': self.calls, 'seconds': self.seconds}
+        if self.track_memory:
+            result.update(allocated_bytes=self.allocated_bytes, peak_bytes=self.peak_bytes)
+        return result
+
+
+class _TimedForces:
+    '''
+    A force backend whose calls are timed as the 'force' phase; other attributes (G, potential_energy) pass through
+    '''
+    def __init__(self, forces, phase):
+        self._forces = forces
+        self._phase = phase
+
+    def __call__(self, *args, **kwargs):
+        with self._phase:
+            return self._forces(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._forces, name)
+
+
+class Profiler:
+    '''
+    Per-phase timers for Simulation, passed as Simulation(profiler=Profiler()). The engine wraps each phase of a
+    step (force evaluation, position and velocity updates, energy logging, trajectory recording) in phase(name).
+    With track_memory=True, tracemalloc also counts the bytes each phase allocates, which slows the run down.
+    Phases must not be nested.
+    '''
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.phases = {}
+        self.total = 0.0 # Wall time of the whole run
+        self._start = None
+        self._started_tracing = False
+
+    def phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = _Phase(self.track_memory)
+        return self.phases[name]
+
+    def wrap_forces(self, forces):
+        return _TimedForces(forces, self.phase('force'))
+
+    def start(self):
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start = time.perf_counter()
+
+    def stop(self):
+        self.total += time.perf_counter() - self._start
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def results(self):
+        '''
+        Dictionary of the totals of every phase, plus 'other' for the time spent outside them, ready for JSON
+        '''
+        results = {name: phase.result() for name, phase in self.phases.items()}
+        results['other'] = {'seconds': max(0.0, self.total - sum(phase.seconds for phase in self.phases.values()))}
+        results['total'] = {'seconds': self.total}
+        return results
+
+    def report(self):
+        '''
+        The results as a table of seconds and percentages of the total
+        '''
+        lines = []
+        for name, result in self.results().items():
+            share = 100 * result['seconds'] / self.total if self.total else 0.0
+            line = f"{name:>10}: {result['seconds']:9.4f} s {share:6.1f}%"
+            if 'calls' in result:
+                line += f" {result['calls']:9d} calls"
+            if 'allocated_bytes' in result:
+                line += f" {result['allocated_bytes'] / 2**20:10.1f} MiB allocated, peak {result['peak_bytes'] / 2**10:.1f} KiB"
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+class NullProfiler:
+    '''
+    Profiler that records nothing, used when a Simulation is not profiled; its phases cost almost nothing
+    '''
+    _phase = nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+    def wrap_forces(self, forces):
+        return forces
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
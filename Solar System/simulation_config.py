@@ -0,0 +1,62 @@
+from dataclasses import dataclass, field, asdict
+from functools import lru_cache
+import json
+import os
+
+# The parameters file shipped next to this module, found independently of the working directory
+PARAMETERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parameters_solar.json')
+
+
+@dataclass(frozen=True)
+class SimulationConfig:
+    '''
+    The contents of a parameters file: the gravitational constant, timestep, number of steps, the bodies and any
+    test particles. Planets and simulations hold a config instead of reading module constants, so several configs
+    can be used side by side in one process.
+    '''
+    grav_const: float
+    timestep: float
+    num_iterations: int
+    bodies: list
+    test_particles: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['grav_const'], data['timestep'], data['num_iterations'], data['bodies'],
+                   data.get('test_particles', []))
+
+    @classmethod
+    def from_json(cls, path=PARAMETERS_PATH):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return asdict(self)
+
+    @property
+    def G(self):
+        return self.grav_const
+
+    @property
+    def dt(self):
+        return self.timestep
+
+    @property
+    def num_steps(self):
+        return self.num_iterations
+
+    @property
+    def total_time(self):
+        return int(self.num_iterations * self.timestep)
+
+    @property
+    def sun_mass(self):
+        return self.bodies[0]['mass']
+
+
+@lru_cache(maxsize=None)
+def default_config():
+    '''
+    The config of the parameters file next to this module, read once on first use
+    '''
+    return SimulationConfig.from_json()
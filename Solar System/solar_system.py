@@ -1,31 +1,39 @@
 from typing import List
-import json
+from importlib.util import find_spec
 import numpy as np
 import math
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib.lines import Line2D
-import tqdm
+import warnings
+from engine import SystemState, get_force_backend
+from integrators import get_integrator
+from trajectory import TrajectoryStore
+from output import ChunkedOutput
+from periods import orbital_periods, OrbitalPeriodTracker
+from alignment import DEFAULT_TOLERANCE, scan_alignments, plot_alignment_events
+from particles import TestParticles
+from diagnostics import DIAGNOSTIC_FIELDS, energy_diagnostics, relative_drift
+from simulation_config import SimulationConfig, default_config
+from profiling import NULL_PROFILER, Profiler
 
-# Load in the data from the data file as a dictionary (?)
 
-with open("Solar System/parameters_solar.json", "r") as f:
-    config = json.load(f)
-
-
-# Set the constant used throughout by reading from config
-
-G = config['grav_const']  
-SUN_MASS = config['bodies'][0]['mass']
-dt = config["timestep"]  
-num_steps = config["num_iterations"]
-total_time = int(num_steps * dt)
+def __getattr__(name):
+    '''
+    The constants of the default parameters file (config, G, SUN_MASS, dt, num_steps, total_time), read on first use
+    rather than at import
+    '''
+    constants = {'config': lambda c: c, 'G': lambda c: c.G, 'SUN_MASS': lambda c: c.sun_mass, 'dt': lambda c: c.dt,
+                 'num_steps': lambda c: c.num_steps, 'total_time': lambda c: c.total_time}
+    if name not in constants:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return constants[name](default_config())
 
 class Planet:
     '''
     Defines a planet and has methods for computing acceleration, updating position and velocity, and checking the orbital radius.
+    The constants come from config, by default the parameters file next to this module.
     '''
-    def __init__(self, name, mass, orbital_radius, colour, integration_method):
+    def __init__(self, name, mass, orbital_radius, colour, integration_method, config: SimulationConfig = None):
+        self.config = config if config is not None else default_config()
+        G, SUN_MASS = self.config.G, self.config.sun_mass
         self.name = name
         self.mass = mass
         self.orbital_radius = orbital_radius  
@@ -53,14 +61,15 @@ class Planet:
         other_matrix = np.stack([other.pos for other in bodies if other is not self]) # Creating a matrix of the planet positions 
         diff_vector = other_matrix - self.pos
         distances = np.linalg.norm(diff_vector, axis=-1)
-        accelerations = G * masses / distances**3 # Acceleration on the planet due to every other planet 
+        accelerations = self.config.G * masses / distances**3 # Acceleration on the planet due to every other planet 
         total_acceleration = np.sum(diff_vector*np.expand_dims(accelerations, -1), axis=0) # Sum these individual accelerations for the total acceleration vector
         return total_acceleration     
 
-    def update_position(self):  
+    def update_position(self, dt=None):  
         '''
-        Updates the position of a planet for either Beeman or Direct Euler
+        Updates the position of a planet for either Beeman or Direct Euler, over dt (by default the timestep of config)
         '''
+        dt = self.config.dt if dt is None else dt
         if self.integration_method == 'beeman':
             new_pos = self.pos + self.v*dt + 1/6 * dt**2 * (4 * self.prev_as[1] - self.prev_as[0]) # Applying Beeman
             self.positions.append(new_pos) # Appending to the array of all positions
@@ -72,19 +81,20 @@ class Planet:
         else:
             pass
 
-    def update_position_euler_cromer(self, new_v): #self.v instead of new.v
+    def update_position_euler_cromer(self, new_v, dt=None): #self.v instead of new.v
         '''
         Updates the position of a planet for the Euler Cromer Integration Method
         '''
-        new_pos = self.pos + new_v * dt
+        new_pos = self.pos + new_v * (self.config.dt if dt is None else dt)
         self.positions.append(new_pos)
         self.pos = new_pos
 
-    def update_velocity(self, new_a):
+    def update_velocity(self, new_a, dt=None):
         '''
         Updates the velocity of the planet 
         '''
         # Update according to each integration method
+        dt = self.config.dt if dt is None else dt
         if self.integration_method == 'beeman':
             self.v += 1/6 * dt * (2 * new_a + 5 * self.prev_as[1] - self.prev_as[0])
         elif self.integration_method == 'euler-cromer':
@@ -95,128 +105,369 @@ class Planet:
     
     # Experiment 1 - Orbital Periods
 
-    def check_orbital_period(self, sun):
-        rotation = 0 #  Initialise the rotation about the sun
-        for i in range(1, num_steps):
-            # Reposition the position vectors to account for sun movement
-            repositioned_prev = self.positions[i-1] - sun.positions[i-1]
-            repositioned_curr = self.positions[i] - sun.positions[i]
-            # Calculate the angle travelled in a timestep
-            angle = np.arccos((np.dot(repositioned_curr, repositioned_prev)) / (np.linalg.norm(repositioned_curr) * np.linalg.norm(repositioned_prev)))
-            rotation += angle # Add this angle to the total rotation
-            if rotation >= 2 * np.pi:       
-                self.orbital_period = i * dt # Record the first time at which we pass 2pi
-                break
+    def check_orbital_period(self, sun, sample_dt=None):
+        '''
+        Find the time taken to sweep 2pi about the sun, where sample_dt is the time between stored positions (by
+        default the timestep)
+        '''
+        sample_dt = self.config.dt if sample_dt is None else sample_dt
+        # Positions relative to the sun at each step account for its movement, see periods.orbital_periods
+        positions = np.stack([np.asarray(sun.positions), np.asarray(self.positions)], axis=1)
+        period = orbital_periods(positions, sample_dt)[1]
+        self.orbital_period = None if np.isnan(period) else float(period)
         
+def _with_prefix(saved, prefix):
+    '''
+    Entries of a checkpoint's extra arrays whose key starts with prefix, with the prefix removed
+    '''
+    return {key[len(prefix):]: value for key, value in saved.items() if key.startswith(prefix)}
+
 class Simulation:
-    def __init__(self, dt, total_time, num_steps, bodies: List[Planet]):
+    def __init__(self, dt, total_time, num_steps, bodies: List[Planet], engine='vectorized', record_stride=1, trajectory_path=None, output: ChunkedOutput = None,
+                 integrator_options=None, force='direct', force_options=None, particles: TestParticles = None,
+                 progress=True, block_steps=10000, energy_every=100, max_energy_drift=None,
+                 config: SimulationConfig = None, profiler: Profiler = None):
+        # Constants such as G come from config, by default the one the planets were made with
+        self.config = config if config is not None else bodies[0].config
         self.dt = dt  # Time step in seconds
         self.total_time = total_time  # Total simulation time
         self.num_steps = num_steps
         self.bodies = bodies
+        # 'vectorized' steps all bodies at once from contiguous arrays, 'loop' is the original per-planet implementation,
+        # and 'numba' runs blocks of block_steps steps of the vectorized engine inside one compiled call
+        if engine not in ('vectorized', 'loop', 'numba'):
+            raise ValueError(f"Unknown engine '{engine}', expected 'vectorized', 'loop' or 'numba'")
+        if engine == 'numba' and find_spec('numba') is None:
+            warnings.warn("Numba is not installed, falling back to the vectorized engine")
+            engine = 'vectorized'
+        self.engine = engine
+        self.block_steps = block_steps
+        self.state = None # SystemState of the vectorized engine
+        self.integrator_options = integrator_options or {} # Passed to the integrator, e.g. {'tolerance': 1e-10} for dopri5
+        self.integrator = None
+        # Gravity backend of the vectorized engine: 'direct' summation or 'barnes-hut' with e.g. {'theta': 0.5}
+        self.force = force
+        self.force_options = force_options or {}
+        # Massless test particles stepped alongside the bodies, feeling their gravity but exerting none
+        if particles is not None and engine == 'loop':
+            raise ValueError("Test particles need the vectorized engine")
+        self.particles = particles
+        self.particle_periods = None
+        # Positions are recorded every record_stride steps, into a memory-mapped .npy file if trajectory_path is given
+        self.record_stride = record_stride
+        self.trajectory_path = trajectory_path
+        self.trajectory = None # TrajectoryStore, filled by simulate()
+        # A ChunkedOutput streams the run to disk in segments instead, with checkpoints to resume from
+        if output is not None and engine != 'vectorized':
+            raise ValueError("Streaming output needs the vectorized engine")
+        self.output = output
+        self.period_tracker = None # OrbitalPeriodTracker used when the history is not kept in memory
+        self.progress = progress # Show a progress bar while simulating
+        self.profiler = profiler if profiler is not None else NULL_PROFILER # Per-phase timers, see profiling.Profiler
         self.energy_log = [] # To record the system energies
+        # Energies and angular momentum are sampled every energy_every steps, as rows of DIAGNOSTIC_FIELDS. If the
+        # total energy drifts from its first sample by more than max_energy_drift (relative), the run stops early
+        self.energy_every = energy_every
+        self.max_energy_drift = max_energy_drift
+        self.diagnostics = []
+        self.aborted = False
+        self.steps_taken = 0
         self.planetary_alignments = [] # To store occurrences of planetary alignment
+        self.alignment_events = [] # The same occurrences merged into AlignmentEvents
+
+    @classmethod
+    def from_config(cls, config: SimulationConfig, integration_method='beeman', **options):
+        '''
+        Build the planets of config and a simulation over its timestep and number of steps
+        '''
+        bodies = [Planet(**p, integration_method=integration_method, config=config) for p in config.bodies]
+        return cls(config.dt, config.total_time, config.num_steps, bodies, config=config, **options)
 
     def compute_total_energy(self): 
         '''
         Compute the total energy of the system for some time instance
         '''
-        # KE = 1/2 * mass * velocity^2
-        kinetic_energy = sum(0.5 * p.mass * (np.dot(p.v, p.v)) for p in self.bodies) 
-        potential_energy = 0 # Initialise a variable to store PE
-        # Iterate over all bodies
-        for i, p1 in enumerate(self.bodies):
-            for j, p2 in enumerate(self.bodies):
-                if i < j:  # Avoid double-counting
-                    r = np.linalg.norm(p1.pos - p2.pos) # Distance
-                    # Calculate GPE
-                    potential_energy += -G * p1.mass * p2.mass / r
-        return kinetic_energy + potential_energy
-    
-    def simulate(self):
+        pos = np.array([p.pos for p in self.bodies], dtype=np.float64)
+        v = np.array([p.v for p in self.bodies], dtype=np.float64)
+        mass = np.array([p.mass for p in self.bodies], dtype=np.float64)
+        return energy_diagnostics(pos, v, mass, len(mass), self.config.G)[2]
+
+    def log_diagnostics(self, time, forces=None):
         '''
-        Execute the simulation, i.e. move the planets 
+        Sample the energies and angular momentum at the current state into diagnostics, and the total energy into
+        energy_log, in one vectorized pass. With the direct force backend the pair distances of the last force
+        evaluation are reused. Sets aborted if the energy has drifted by more than max_energy_drift.
         '''
-        for step in tqdm.tqdm(range(self.num_steps)):
-            time = step * dt # Time in years
+        if self.state is not None:
+            state = self.state
+            row = energy_diagnostics(state.pos, state.v, state.mass, state.n_massive, self.config.G, forces)
+        else:
+            pos = np.array([p.pos for p in self.bodies], dtype=np.float64)
+            v = np.array([p.v for p in self.bodies], dtype=np.float64)
+            mass = np.array([p.mass for p in self.bodies], dtype=np.float64)
+            row = energy_diagnostics(pos, v, mass, len(mass), self.config.G)
+        self._append_diagnostics([(time,) + row])
+        return float(row[2])
+
+    def _append_diagnostics(self, rows):
+        for row in rows:
+            row = tuple(float(x) for x in row)
+            self.diagnostics.append(row)
+            self.energy_log.append((row[0], row[3]))
+        if self.max_energy_drift is not None and self.energy_log:
+            self.aborted = bool(abs(self.energy_log[-1][1] / self.energy_log[0][1] - 1) > self.max_energy_drift)
+
+    @property
+    def energy_drift(self):
+        '''
+        Relative drift |E - E0| / |E0| of every sample of energy_log from the first one
+        '''
+        return relative_drift([energy for time, energy in self.energy_log])
+
+    def simulate(self, resume=False, on_frame=None, frame_every=1):
+        '''
+        Execute the simulation, i.e. move the planets. With streaming output, resume=True continues from the last
+        checkpoint in the output directory if there is one. If on_frame is given, it is called as
+        on_frame(step, positions) at the start and every frame_every steps while the simulation runs, e.g. to
+        animate it; the (N, 2) positions are only valid during the call.
+        '''
+        self.profiler.start()
+        if self.engine == 'vectorized':
+            self.simulate_vectorized(resume, on_frame, frame_every)
+        elif self.engine == 'numba':
+            self.simulate_compiled(on_frame, frame_every)
+        else:
+            self.simulate_loop(on_frame, frame_every)
+            self.trajectory = TrajectoryStore.from_bodies(self.bodies, self.dt)
+        self.profiler.stop()
+
+        # Find the orbital period of each planet for experiment 1, all at once from the recorded trajectory, or
+        # from the online tracker for a streamed run
+        if self.trajectory is not None:
+            periods = orbital_periods(self.trajectory.positions[:self.trajectory.count], self.trajectory.sample_dt)
+        else:
+            periods = self.period_tracker.periods
+        for p, period in zip(self.bodies, periods):
+            if p.name != 'sun':
+                p.orbital_period = None if np.isnan(period) else float(period)
+        if self.particles is not None:
+            self.particle_periods = periods[len(self.bodies):]
+
+    def simulate_vectorized(self, resume=False, on_frame=None, frame_every=1):
+        '''
+        Move all planets at once. Positions, velocities, masses and previous accelerations live in (N, 2) arrays
+        and the planets become read-only views onto them.
+        '''
+        methods = {p.integration_method for p in self.bodies}
+        if len(methods) != 1:
+            raise ValueError(f"The vectorized engine needs every body to use the same integration method, got {methods}")
+        self.integrator = integrator = get_integrator(methods.pop(), **self.integrator_options)
+        integrator.profiler = self.profiler
+        phase = self.profiler.phase
+
+        self.state = state = SystemState(self.bodies, self.particles)
+        forces = self.profiler.wrap_forces(get_force_backend(self.force, self.config.G, **self.force_options))
+        output = self.output
+        start = 0
+        if output is not None:
+            # Positions and energies go to disk segment by segment, and orbital periods are found on the fly
+            state.bind(self.bodies)
+            recorder = output
+            self.period_tracker = tracker = OrbitalPeriodTracker(len(state))
+            if resume and output.can_resume():
+                start, extra = output.resume(self, state)
+                tracker.load_state_dict(_with_prefix(extra, 'periods_'))
+                integrator.load_state_dict(_with_prefix(extra, 'integrator_'))
+            else:
+                output.start(self, state)
+                tracker.start(state.pos)
+        else:
+            # Positions are recorded into one preallocated array, with planet.positions a view of its column
+            self.trajectory = recorder = TrajectoryStore(self.num_steps, len(state), self.dt, self.record_stride, self.trajectory_path)
+            state.bind(self.bodies, recorder.positions)
+        if start == 0:
+            recorder.record(0, state.pos)
+            integrator.start(state, forces)
+            if on_frame is not None:
+                on_frame(0, state.pos)
+
+        self.steps_taken = start
+        for step in self._progress_bar(range(start, self.num_steps)):
+            time = step * self.dt # Time in years
+            integrator.step(state, forces, self.dt)
+            with phase('record'):
+                recorder.record(step + 1, state.pos)
+            # Log the energies every energy_every steps
+            if step % self.energy_every == 0:
+                with phase('energy'):
+                    energy = self.log_diagnostics(time, forces)
+                    if output is not None:
+                        output.log_energy(time, energy)
+                        output.log_diagnostics(self.diagnostics[-1])
+            if output is not None:
+                with phase('record'):
+                    if (step + 1) % output.stride == 0 and not tracker.done:
+                        tracker.update(state.pos, (step + 1) * self.dt)
+                    output.end_step(step + 1, state, self._checkpoint_extra)
+            self.steps_taken = step + 1
+            if on_frame is not None and self.steps_taken % frame_every == 0:
+                on_frame(self.steps_taken, state.pos)
+            if self.aborted:
+                break
+
+        if output is not None:
+            output.close(self.steps_taken, state, self._checkpoint_extra())
+        else:
+            recorder.flush()
+
+    def simulate_compiled(self, on_frame=None, frame_every=1):
+        '''
+        Run the vectorized engine with Numba-compiled kernels: each call to the kernel takes block_steps steps,
+        including the forces, the integrator update, recording and energy logging, without returning to Python.
+        Frames are passed to on_frame from the recorded positions after each block.
+        '''
+        methods = {p.integration_method for p in self.bodies}
+        from kernels import BLOCK_KERNELS
+
+        if len(methods) != 1 or not methods <= BLOCK_KERNELS.keys():
+            raise ValueError(f"The numba engine supports one of {sorted(BLOCK_KERNELS)} for every body, got {methods}")
+        if self.force != 'direct':
+            raise ValueError("The numba engine only supports direct summation")
+        if on_frame is not None and frame_every % self.record_stride != 0:
+            raise ValueError("With the numba engine, frame_every must be a multiple of record_stride")
+        method = methods.pop()
+        kernel = BLOCK_KERNELS[method]
+        self.integrator = integrator = get_integrator(method)
+
+        self.state = state = SystemState(self.bodies, self.particles)
+        self.trajectory = recorder = TrajectoryStore(self.num_steps, len(state), self.dt, self.record_stride, self.trajectory_path)
+        state.bind(self.bodies, recorder.positions)
+        recorder.record(0, state.pos)
+        integrator.start(state, get_force_backend('direct', self.config.G))
+        if on_frame is not None:
+            on_frame(0, state.pos)
+
+        records = np.asarray(recorder.positions) # A plain view, also of a memmap, for the kernel to write into
+        energies = np.empty((self.block_steps // self.energy_every + 1, len(DIAGNOSTIC_FIELDS)))
+        max_drift = np.inf if self.max_energy_drift is None else self.max_energy_drift
+        bar = self._progress_bar(total=self.num_steps)
+        for first in range(0, self.num_steps, self.block_steps):
+            last = min(first + self.block_steps, self.num_steps)
+            energy0 = self.energy_log[0][1] if self.energy_log else np.nan
+            # The phases of a compiled block cannot be told apart, so the whole call is timed as 'kernel'
+            with self.profiler.phase('kernel'):
+                logged, self.steps_taken = kernel(state.pos, state.v, state.prev_as, state.mass, state.n_massive,
+                                                  self.config.G, self.dt, first, last, self.record_stride, records,
+                                                  self.energy_every, energies, energy0, max_drift)
+            with self.profiler.phase('energy'):
+                self._append_diagnostics(energies[:logged])
+            recorder.count = self.steps_taken // self.record_stride + 1
+            if on_frame is not None:
+                for step in range(first + frame_every - first % frame_every, self.steps_taken + 1, frame_every):
+                    on_frame(step, records[step // self.record_stride])
+            if bar is not None:
+                bar.update(self.steps_taken - first)
+            if self.aborted:
+                break
+        if bar is not None:
+            bar.close()
+        recorder.flush()
+
+    def _progress_bar(self, iterable=None, total=None):
+        '''
+        Wrap iterable in a tqdm progress bar if progress is shown (tqdm is only imported then); otherwise return
+        the iterable unchanged
+        '''
+        if not self.progress:
+            return iterable
+        import tqdm
+        return tqdm.tqdm(iterable, total=total)
+
+    def _checkpoint_extra(self):
+        '''
+        Online state saved alongside the integrator state in checkpoints
+        '''
+        extra = {f'periods_{key}': value for key, value in self.period_tracker.state_dict().items()}
+        extra.update({f'integrator_{key}': value for key, value in self.integrator.state_dict().items()})
+        return extra
+
+    @property
+    def step_sizes(self):
+        '''
+        Internal step sizes taken by an adaptive integrator, or None for fixed-step schemes
+        '''
+        if self.integrator is None or not self.integrator.adaptive:
+            return None
+        return np.array(self.integrator.step_sizes)
+
+    def simulate_loop(self, on_frame=None, frame_every=1):
+        '''
+        Move the planets one at a time (the original implementation, kept for reference), with the timestep of the
+        simulation like the other engines
+        '''
+        for p in self.bodies:
+            if p.integration_method not in ('beeman', 'euler-cromer', 'direct-euler'):
+                raise ValueError(f"The loop engine does not support '{p.integration_method}', use the vectorized engine")
+        if on_frame is not None:
+            on_frame(0, np.array([p.pos for p in self.bodies]))
+        for step in self._progress_bar(range(self.num_steps)):
+            if self.aborted:
+                break
+            time = step * self.dt # Time in years
             for p in self.bodies:
                 # Set the previous acceleration for each planet before any have been updated 
                 p.prev_as[1] = p.compute_acceleration(self.bodies)
             if self.bodies[0].integration_method == 'beeman':
                 # First update the position for all bodies
                 for p in self.bodies:
-                    p.update_position()
+                    p.update_position(self.dt)
                 for p in self.bodies:
                     # Calculate acceleration now that the positions have updated
                     new_a = p.compute_acceleration(self.bodies)
                     # Update velocity using this new acceleration
-                    p.update_velocity(new_a)
+                    p.update_velocity(new_a, self.dt)
                     # Update the prev_as list 
                     p.prev_as[0] = p.prev_as[1]
             else: # Simulate for Euler Cromer / Direct Euler
                 for p in self.bodies:
                     if p.integration_method == 'direct-euler': # Direct Euler
                         # First update the position
-                        p.update_position() 
+                        p.update_position(self.dt) 
                         # Then update the velocity 
-                        p.update_velocity(p.prev_as[1])
+                        p.update_velocity(p.prev_as[1], self.dt)
                     else: # euler cromer
                         # First update the velocity 
-                        new_v = p.update_velocity(p.prev_as[1])
+                        new_v = p.update_velocity(p.prev_as[1], self.dt)
                         # Then update the position using this velocity
-                        p.update_position_euler_cromer(new_v)
-            # Log total system energy every 100 steps
-            if step % 100 == 0:
-                self.energy_log.append((time, self.compute_total_energy()))
-
-        # Find the orbital period of each planet for experiment 1
-        for p in self.bodies:
-            if p.name != 'sun':
-                p.check_orbital_period(self.bodies[0])
+                        p.update_position_euler_cromer(new_v, self.dt)
+            # Log the energies every energy_every steps
+            if step % self.energy_every == 0:
+                self.log_diagnostics(time)
+            self.steps_taken = step + 1
+            if on_frame is not None and self.steps_taken % frame_every == 0:
+                on_frame(self.steps_taken, np.array([p.pos for p in self.bodies]))
 
     # Experiment 4 - Planetary Alignments 
 
-    def planetary_alignment(self):
+    def planetary_alignment(self, bodies=None, tolerance=DEFAULT_TOLERANCE, plot_path=None, chunk_size=100000):
         '''
-        Determine the years at which alignment of the five innermost planets occurs.
+        Determine the years at which alignment of the given planets (by default the five innermost) occurs, from the
+        recorded trajectory, or the segments written by a ChunkedOutput. The tolerance is the sine of the allowed
+        angle from the mean line. Consecutive aligned records are merged into AlignmentEvents, and if plot_path is
+        given every event is drawn to that file.
         '''
-        # Obtain the five innermost planets and the Sun
-        innermost_five = self.bodies[1:6]   
-        sun = self.bodies[0]
-        colours = [p.colour for p in innermost_five]
-        labels = [p.name for p in self.bodies[:6]]
-        
-        for i in range(1, num_steps):
-            # Obtain the position vectors for the planets and adjust for Sun movement
-            vectors = np.array([(p.positions[i] - sun.positions[i]) for p in innermost_five])
-            # Find the mean of these vectors
-            mean_vector = np.mean(vectors, axis=0)
-            
-            if np.linalg.norm(mean_vector) == 0:
-                continue  # Skip this step if the mean vector is zero
-            
-            # Normalise this mean vector
-            mean_unit_vector = mean_vector / np.linalg.norm(mean_vector)
-            line_direction = mean_unit_vector
-            # Normalise the position vectors
-            normalised_vectors = vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
-            a, b = line_direction
-            # Perpendicular distance between the line and the normaalised points
-            distances = np.abs(normalised_vectors[:, 0] * b - normalised_vectors[:, 1] * a) / np.linalg.norm(line_direction)
-            if all(distance <= np.sin(np.pi / 36) for distance in distances): # Limit on distance corresponds to angular limit
-                self.planetary_alignments.append(i * dt) # Gives time in years
-                # Plot the alignment instance 
-                pos_x = [v[0] for v in vectors]
-                pos_y = [v[1] for v in vectors]
-                plt.xlim(-5.5, 5.5)
-                plt.ylim(-5.5, 5.5)
-                plt.title(f'Planetary Alignment at {i*dt:.2f} years')
-                # Include the mean line we find the distance from
-                plt.axline((0,0), mean_vector, linestyle='--', c='black', linewidth=0.5)
-                plt.scatter(pos_x, pos_y, c=colours)
-                plt.scatter([0], [0], c=sun.colour)
-                legend_handles = [Line2D([0], [0], marker='o', color='w', markerfacecolor=col, markersize=10, label=lab) 
-                      for col, lab in zip([sun.colour]+colours, labels)]
-                plt.legend(handles=legend_handles)
-                plt.show()
-        
\ No newline at end of file
+        names = [p.name for p in self.bodies]
+        body_indices = [names.index(name) for name in bodies] if bodies is not None else list(range(1, 6))
+        if self.trajectory is not None:
+            positions, sample_dt = self.trajectory.positions[:self.trajectory.count], self.trajectory.sample_dt
+        elif self.output is not None:
+            # The run was streamed to disk, so there is no trajectory in memory
+            positions, sample_dt = self.output.load_trajectory(mmap_mode='r'), self.dt * self.output.stride
+        else:
+            raise ValueError("No trajectory to scan for alignments: run simulate() first")
+        events, times = scan_alignments(positions, sample_dt, body_indices, tolerance=tolerance, chunk_size=chunk_size)
+        self.planetary_alignments = [float(t) for t in times] # Gives time in years
+        self.alignment_events = events
+        if plot_path is not None and events:
+            plot_alignment_events(events, positions, sample_dt, self.bodies, body_indices, path=plot_path)
+        return events
@@ -0,0 +1,49 @@
+from solar_system import Planet, Simulation, total_time, config
+from diagnostics import relative_drift
+import numpy as np
+import time
+
+# A tenth of the parameters file, long enough for the energy errors to settle into their trend
+YEARS = total_time / 10
+BEEMAN_TIMESTEPS = (0.001, 0.0005, 0.00025, 0.000125)
+DOPRI5_TOLERANCES = (1e-8, 1e-9, 1e-10, 1e-11, 1e-12)
+DOPRI5_OUTPUT_DT = 0.01
+
+def run(method, timestep, **options):
+    '''
+    Simulate the solar system for YEARS, returning the force evaluations per simulated year, the largest relative
+    energy error, the internal step sizes (None for fixed steps) and the run time
+    '''
+    num_steps = round(YEARS / timestep)
+    bodies = [Planet(**p, integration_method=method, config=config) for p in config.bodies]
+    sim = Simulation(timestep, YEARS, num_steps, bodies, integrator_options=options, progress=False)
+    start = time.perf_counter()
+    sim.simulate()
+    run_time = time.perf_counter() - start
+    # Fixed-step schemes evaluate the forces once at the start and once per step
+    evaluations = getattr(sim.integrator, 'force_evaluations', num_steps + 1)
+    energies = [energy for _, energy in sim.energy_log]
+    return evaluations / YEARS, relative_drift(energies).max(), sim.step_sizes, run_time
+
+def main():
+    print(f"Force evaluations per simulated year over {YEARS:g} years")
+    beeman = []
+    for timestep in BEEMAN_TIMESTEPS:
+        per_year, error, _, run_time = run('beeman', timestep)
+        beeman.append((per_year, error))
+        print(f"beeman, dt = {timestep}: {per_year:.0f} evaluations/year, energy error {error:.2e}, {run_time:.1f} s")
+
+    # The Beeman cost of any energy error, interpolated between the runs above on a log-log scale
+    costs, errors = np.log([b[0] for b in beeman]), np.log([b[1] for b in beeman])
+    slope, intercept = np.polyfit(errors, costs, 1)
+    for tolerance in DOPRI5_TOLERANCES:
+        per_year, error, steps, run_time = run('dopri5', DOPRI5_OUTPUT_DT, tolerance=tolerance)
+        matched = np.exp(intercept + slope * np.log(error))
+        print(f"dopri5, tolerance {tolerance:.0e}: {per_year:.0f} evaluations/year, energy error {error:.2e}, "
+              f"{run_time:.1f} s; steps {steps.min():.5f} to {steps.max():.5f} years (median {np.median(steps):.5f}); "
+              f"Beeman needs about {matched:.0f} evaluations/year for the same error ({matched / per_year:.2f}x)")
+    # At high accuracy the fifth-order scheme needs fewer evaluations than Beeman for the same energy error
+    assert per_year < matched
+
+if __name__ == '__main__':
+    main()
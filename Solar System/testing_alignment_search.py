@@ -0,0 +1,73 @@
+from dataclasses import replace
+from solar_system import Simulation, config
+from alignment_search import search_alignments
+from kernels import NUMBA_AVAILABLE
+import numpy as np
+import time
+
+# The numba engine makes the long search take seconds rather than minutes
+ENGINE = 'numba' if NUMBA_AVAILABLE else 'vectorized'
+SEARCH_YEARS = 10000 if NUMBA_AVAILABLE else 1000
+# Beeman at the timestep of the parameters file drifts by over a radian of Mercury's orbit in 240 years, enough to
+# make or miss an alignment, so the cheap search is checked against a run at an eighth of it
+REFERENCE_REFINEMENT = 8
+
+def work(summary):
+    return (f"{summary.integrated_steps} steps integrated ({summary.checkpoint_steps} for the checkpoints, "
+            f"{summary.refined_steps} fine for the refinements) against {summary.brute_force_steps} by brute force, "
+            f"{summary.scanned_steps} recorded and scanned")
+
+def compare(events, found, label):
+    for event, match in zip(events, found):
+        print(f"    tightest at {event.peak:.3f} years ({label}), {match.peak:.3f} years (search)")
+    assert len(found) == len(events)
+
+def main():
+    # Brute force: step, record and scan every step of the parameters file, which also measures the orbital periods
+    start = time.perf_counter()
+    sim = Simulation.from_config(config, 'beeman', engine=ENGINE, progress=False)
+    sim.simulate()
+    events = sim.planetary_alignment()
+    brute_force_time = time.perf_counter() - start
+    print(f"Brute force over {config.total_time} years: {len(events)} alignments in {brute_force_time:.2f} s")
+    periods = np.array([np.nan] + [p.orbital_period for p in sim.bodies[1:]])
+
+    # With checkpoints from the same integrator and timestep as the refinements, the search finds the events of
+    # the full run exactly
+    found, summary = search_alignments(config, config.total_time, periods, checkpoint_method='beeman',
+                                       checkpoint_timestep=config.dt, checkpoint_options={'engine': ENGINE},
+                                       engine=ENGINE)
+    print(f"Two-stage search from fine checkpoints: {len(found)} alignments, {summary.candidates} candidate windows")
+    print(f"    {work(summary)}")
+    compare(events, found, 'brute force')
+    assert all(abs(event.peak - match.peak) < config.dt / 2 for event, match in zip(events, found))
+
+    # With cheap checkpoints, from wisdom-holman at ten times the timestep, the events are those of a converged run
+    fine = replace(config, timestep=config.dt / REFERENCE_REFINEMENT,
+                   num_iterations=config.num_steps * REFERENCE_REFINEMENT)
+    reference = Simulation.from_config(fine, 'beeman', engine=ENGINE, progress=False,
+                                       record_stride=REFERENCE_REFINEMENT)
+    reference.simulate()
+    events = reference.planetary_alignment()
+    start = time.perf_counter()
+    found, summary = search_alignments(config, config.total_time, periods, engine=ENGINE)
+    print(f"Reference at dt / {REFERENCE_REFINEMENT}: {len(events)} alignments")
+    print(f"Two-stage search from wisdom-holman checkpoints: {len(found)} alignments in "
+          f"{time.perf_counter() - start:.2f} s, {summary.candidates} candidate windows")
+    print(f"    {work(summary)}")
+    compare(events, found, 'reference')
+    assert all(abs(event.peak - match.peak) < 0.01 for event, match in zip(events, found))
+    assert summary.integrated_steps < summary.brute_force_steps / 5
+
+    # A search far beyond what could be recorded and scanned step by step. Leapfrog checkpoints at ten times the
+    # timestep are as accurate as brute-force Beeman and run on the numba engine
+    start = time.perf_counter()
+    found, summary = search_alignments(config, SEARCH_YEARS, periods, checkpoint_method='leapfrog',
+                                       checkpoint_options={'engine': ENGINE}, engine=ENGINE)
+    print(f"Two-stage search over {SEARCH_YEARS} years: {len(found)} alignments in {time.perf_counter() - start:.1f} s")
+    print(f"    {work(summary)}")
+    for event in found:
+        print(f"Planetary alignment from {event.start:.3f} to {event.end:.3f} years, tightest at {event.peak:.3f} years")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+from solar_system import G, config
+from engine import DirectForce
+from barnes_hut import BarnesHutForce
+import matplotlib.pyplot as plt
+import numpy as np
+import time
+
+def belt_population(num_asteroids, seed=0):
+    '''
+    Positions and masses of the bodies in the parameters file plus an asteroid belt of massive bodies between 2.2
+    and 3.3 AU, at random angles
+    '''
+    rng = np.random.default_rng(seed)
+    radii = np.array([p['orbital_radius'] for p in config.bodies])
+    masses = np.array([p['mass'] for p in config.bodies])
+    angles = rng.uniform(0, 2 * np.pi, len(radii))
+    belt_radii = rng.uniform(2.2, 3.3, num_asteroids)
+    belt_angles = rng.uniform(0, 2 * np.pi, num_asteroids)
+    belt_masses = rng.uniform(1e-6, 1e-4, num_asteroids) # Earth masses
+    radii, angles = np.concatenate([radii, belt_radii]), np.concatenate([angles, belt_angles])
+    pos = np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=1)
+    return pos, np.concatenate([masses, belt_masses])
+
+def time_call(function, *args, repeats=3):
+    '''
+    Best wall time of a few calls
+    '''
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def accuracy(num_asteroids=2000, thetas=(0.0, 0.3, 0.5, 0.7, 1.0)):
+    '''
+    Relative error of the Barnes-Hut accelerations against direct summation, for several opening angles
+    '''
+    pos, mass = belt_population(num_asteroids)
+    direct = DirectForce(G)(pos, mass)
+    # Errors relative to the total acceleration, and relative to the sun-free part felt from the other bodies
+    to_sun = pos[0] - pos[1:]
+    sun_free = direct[1:] - G * mass[0] * to_sun / np.linalg.norm(to_sun, axis=1)[:, None]**3
+    print(f"Accuracy against direct summation, {len(pos)} bodies")
+    for theta in thetas:
+        error = np.linalg.norm(BarnesHutForce(G, theta)(pos, mass) - direct, axis=1)
+        relative = error[1:] / np.linalg.norm(direct[1:], axis=1)
+        perturbation = error[1:] / np.linalg.norm(sun_free, axis=1)
+        print(f"theta = {theta}: median relative error {np.median(relative):.2e}, max {relative.max():.2e}; "
+              f"median error on the perturbation from other bodies {np.median(perturbation):.2e}")
+
+def benchmark(body_counts=(100, 300, 1000, 3000, 10000), theta=0.5):
+    '''
+    Time one force evaluation with each backend, and find where Barnes-Hut overtakes direct summation
+    '''
+    direct_times, tree_times = [], []
+    for n in body_counts:
+        pos, mass = belt_population(n - len(config.bodies))
+        direct_times.append(time_call(DirectForce(G), pos, mass))
+        tree_times.append(time_call(BarnesHutForce(G, theta), pos, mass))
+        print(f"N = {n}: direct {direct_times[-1]*1e3:.1f} ms, Barnes-Hut {tree_times[-1]*1e3:.1f} ms")
+    faster = [n for n, d, t in zip(body_counts, direct_times, tree_times) if t < d]
+    if faster:
+        print(f"Barnes-Hut (theta = {theta}) overtakes direct summation by N = {faster[0]}")
+
+    plt.loglog(body_counts, direct_times, c='maroon', marker='o', label='Direct')
+    plt.loglog(body_counts, tree_times, c='cadetblue', marker='o', label=f'Barnes-Hut, theta = {theta}')
+    plt.ylabel('Time per force evaluation, s')
+    plt.xlabel('Number of bodies')
+    plt.grid(linestyle = '--', linewidth = 0.5)
+    plt.legend()
+    plt.show()
+
+def main():
+    accuracy()
+    benchmark()
+
+if __name__ == '__main__':
+    main()
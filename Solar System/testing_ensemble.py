@@ -0,0 +1,38 @@
+from ensemble import EnsembleMember, run_ensemble
+from solar_system import config
+import os
+
+def shared_blocks():
+    # The shared memory segments of this machine, where the blocks of run_ensemble live
+    return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+def test_failed_run(processes):
+    '''
+    A member that fails (here with an unknown integration method) must raise, and leave no shared memory behind
+    '''
+    members = [EnsembleMember(num_steps=200), EnsembleMember(integration_method='no such method', num_steps=200)]
+    before = shared_blocks()
+    try:
+        run_ensemble(members, config, processes=processes)
+    except ValueError as error:
+        print(f"processes={processes}: failed run raised {error!r}")
+    else:
+        raise AssertionError("run_ensemble did not raise for a failing member")
+    leaked = shared_blocks() - before
+    assert not leaked, f"shared memory left behind: {sorted(leaked)}"
+
+def test_run(processes):
+    members = [EnsembleMember(num_steps=200), EnsembleMember('leapfrog', num_steps=200)]
+    before = shared_blocks()
+    with run_ensemble(members, config, processes=processes) as results:
+        assert all(result.trajectory.shape[0] == 3 for result in results)
+    assert shared_blocks() == before
+
+def main():
+    for processes in (1, 2):
+        test_run(processes)
+        test_failed_run(processes)
+    print("No shared memory left behind")
+
+if __name__ == '__main__':
+    main()
@@ -1,61 +1,55 @@
-from solar_system import Planet, Simulation, dt, total_time, num_steps, config
+from solar_system import dt, total_time, config
+from integrators import INTEGRATORS
+from ensemble import EnsembleMember, run_ensemble
+from diagnostics import relative_drift
 import matplotlib.pyplot as plt
 
-def main():
-    # Generate a simulation using Beeman integration
-    planets_beeman = [Planet(**p, integration_method='beeman') for p in config["bodies"]]
-    sim_beeman = Simulation(dt, total_time, num_steps, planets_beeman)
-    sim_beeman.simulate()
-
-
-    # Generate a simulation using Euler Cromer integration
-    planets_euler_cromer = [Planet(**p, integration_method='euler-cromer') for p in config["bodies"]]
-    sim_euler_cromer = Simulation(dt, total_time, num_steps, planets_euler_cromer)
-    sim_euler_cromer.simulate()
-
-
-    # Generate a simulation using Direct Euler integration
-    planets_direct_euler = [Planet(**p, integration_method='direct-euler') for p in config["bodies"]]
-    sim_direct_euler = Simulation(dt, total_time, num_steps, planets_direct_euler)
-    sim_direct_euler.simulate()
-
-
-    # Create lists for the logged system energies for all three methods and a list for the corresponding times
-    beeman_energies = [e for t,e in sim_beeman.energy_log]
-    euler_cromer_energies = [e for t,e in sim_euler_cromer.energy_log]
-    direct_euler_energies = [e for t,e in sim_direct_euler.energy_log]
-    times = [t for t,e in sim_beeman.energy_log] # Diff num steps to energy log occurances
-
-    # Plot all three methods
-
-    plt.plot(times, beeman_energies, c='maroon', label='Beeman', linewidth=0.5)  
-    plt.plot(times, euler_cromer_energies, c='lightblue', label='Euler Cromer', linewidth=0.5)
-    plt.plot(times, direct_euler_energies, c='cadetblue', label='Direct Euler')
+# Colour for each integration method in the plots
+COLOURS = {'beeman': 'maroon', 'euler-cromer': 'lightblue', 'direct-euler': 'cadetblue', 'leapfrog': 'darkorange',
+           'yoshida4': 'seagreen', 'wisdom-holman': 'purple', 'dopri5': 'goldenrod'}
+
+# Higher-order and Keplerian-split schemes can take much larger steps for the same energy error
+TIMESTEPS = {'yoshida4': 10 * dt, 'wisdom-holman': 10 * dt, 'dopri5': 10 * dt}
+
+def member(method):
+    '''
+    Ensemble member simulating the solar system for total_time years with one integration method
+    '''
+    timestep = TIMESTEPS.get(method, dt)
+    steps = round(total_time / timestep)
+    # Only the energies are needed, so record just the first and last positions
+    return EnsembleMember(method, timestep, steps, record_stride=steps)
+
+def plot_energies(sims, methods):
+    for method in methods:
+        times = sims[method].energy_log[:, 0]
+        energies = sims[method].energy_log[:, 1]
+        plt.plot(times, energies, c=COLOURS.get(method), label=method, linewidth=0.5)
     plt.ylabel('Total System Energy')
     plt.xlabel('Time, years')
     plt.grid(linestyle = '--', linewidth = 0.5)
     plt.legend()
-    plt.show() 
-
-    # Plot Beeman energies only
+    plt.show()
 
-    plt.plot(times, beeman_energies, c='maroon', label='Beeman', linewidth=0.5)
-    plt.ylabel('Total System Energy')
-    plt.xlabel('Time, years')
-    plt.grid(linestyle = '--', linewidth = 0.5)
-    plt.legend()
-    plt.show() 
+def main():
+    # Generate a simulation with every registered integration method, run in parallel
+    methods = list(INTEGRATORS)
+    results = run_ensemble([member(method) for method in methods], config)
+    sims = dict(zip(methods, results))
+    for method, result in sims.items():
+        print(f"{method}: dt = {result.member.timestep} years, {result.run_time:.1f} s, max relative energy error {relative_drift(result.energy_log[:, 1]).max():.2e}")
 
-    # Plot Euler Cromer energies only
+    # Plot all methods together
+    plot_energies(sims, sims.keys())
 
-    plt.plot(times, euler_cromer_energies, c='lightblue', label='Euler Cromer', linewidth=0.5)
-    plt.ylabel('Total System Energy')
-    plt.xlabel('Time, years')
-    plt.grid(linestyle = '--', linewidth = 0.5)
-    plt.legend()
-    plt.show() 
+    # Plot each method on its own
+    for method in sims:
+        plot_energies(sims, [method])
 
+    # Plot Beeman and Euler Cromer energies together
+    plot_energies(sims, ['beeman', 'euler-cromer'])
+    results.close()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
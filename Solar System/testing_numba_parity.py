@@ -0,0 +1,44 @@
+from solar_system import Planet, Simulation, dt, total_time, num_steps, config
+from kernels import NUMBA_AVAILABLE
+from periods import orbital_periods
+import numpy as np
+import time
+
+def run(engine, method='beeman', steps=num_steps):
+    '''
+    Simulate the solar system with one engine, returning the simulation and the wall time of the stepping alone
+    '''
+    bodies = [Planet(p['name'], p['mass'], p['orbital_radius'], p['colour'], method) for p in config.bodies]
+    sim = Simulation(dt, steps * dt, steps, bodies, engine=engine, progress=False)
+    start = time.perf_counter()
+    sim.simulate_compiled() if engine == 'numba' else sim.simulate_vectorized()
+    return sim, time.perf_counter() - start
+
+def parity(method):
+    '''
+    Compare the compiled kernel against the NumPy engine; the two only differ in the order of floating-point sums
+    '''
+    reference, reference_time = run('vectorized', method)
+    compiled, compiled_time = run('numba', method)
+    positions = compiled.trajectory.positions - reference.trajectory.positions
+    energies = np.array(compiled.energy_log) - np.array(reference.energy_log)
+    periods = [orbital_periods(sim.trajectory.positions, sim.trajectory.sample_dt) for sim in (compiled, reference)]
+    print(f"{method}: largest position difference {np.abs(positions).max():.2e} AU, "
+          f"energy {np.abs(energies[:, 1] / np.array(reference.energy_log)[:, 1]).max():.2e} (relative), "
+          f"orbital period {np.nanmax(np.abs(periods[0] - periods[1])):.2e} years")
+    print(f"    NumPy engine {num_steps / reference_time / 1e6:.3f} million steps/s, "
+          f"numba engine {num_steps / compiled_time / 1e6:.3f} million steps/s")
+    assert np.allclose(compiled.trajectory.positions, reference.trajectory.positions, rtol=0, atol=1e-8)
+
+def main():
+    if not NUMBA_AVAILABLE:
+        print("Numba is not installed, so Simulation(engine='numba') uses the NumPy engine")
+        return
+    for method in ('beeman', 'leapfrog'):
+        run('numba', method, steps=10) # Compile the kernels before timing
+    print(f"Parity of the numba engine over {total_time} years")
+    for method in ('beeman', 'leapfrog'):
+        parity(method)
+
+if __name__ == '__main__':
+    main()
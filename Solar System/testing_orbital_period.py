@@ -2,7 +2,7 @@ from solar_system import Planet, Simulation, dt, total_time, num_steps, config
 
 def main():
     # Run the simulation
-    planets_beeman = [Planet(**p, integration_method='beeman') for p in config["bodies"]]
+    planets_beeman = [Planet(**p, integration_method='beeman') for p in config.bodies]
     sim_beeman = Simulation(dt, total_time, num_steps, planets_beeman)
     sim_beeman.simulate()
 
@@ -2,13 +2,15 @@ from solar_system import Planet, Simulation, dt, total_time, num_steps, config
 
 def main():
     # Run the simulation
-    planets_beeman = [Planet(**p, integration_method='beeman') for p in config["bodies"]]
+    planets_beeman = [Planet(**p, integration_method='beeman') for p in config.bodies]
     sim_beeman = Simulation(dt, total_time, num_steps, planets_beeman)
     sim_beeman.simulate()
-    sim_beeman.planetary_alignment()
+    # Draw every alignment on one figure, saved to file rather than shown one at a time
+    events = sim_beeman.planetary_alignment(plot_path='planetary_alignments.png')
 
     # Print the alignment occurances 
-    print(f"Planetary alignments: {sim_beeman.planetary_alignments}")
+    for event in events:
+        print(f"Planetary alignment from {event.start:.3f} to {event.end:.3f} years, tightest at {event.peak:.3f} years")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
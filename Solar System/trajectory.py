@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class TrajectoryStore:
+    '''
+    Preallocated store of body positions, shape (records, N, 2). A record is taken every `stride` steps, and the
+    array can be backed by a memory-mapped .npy file on disk so long runs need bounded memory.
+    '''
+    def __init__(self, num_steps, n_bodies, dt, stride=1, path=None):
+        if stride < 1:
+            raise ValueError(f"Recording stride must be a positive integer, got {stride}")
+        self.dt = dt
+        self.stride = stride
+        self.sample_dt = dt * stride # Time between two records
+        self.num_records = num_steps // stride + 1 # Records at steps 0, stride, 2*stride, ...
+        shape = (self.num_records, n_bodies, 2)
+        if path is None:
+            self.positions = np.empty(shape, dtype=np.float64)
+        else:
+            # A .npy file opened as np.memmap, so it can be reloaded later with np.load(path, mmap_mode='r')
+            self.positions = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=shape)
+        self.path = path
+        self.count = 0 # Number of records written so far
+
+    @classmethod
+    def from_bodies(cls, bodies, dt):
+        '''
+        Build a store from planets that kept their own lists of positions (the loop engine)
+        '''
+        positions = np.stack([np.asarray(p.positions) for p in bodies], axis=1)
+        store = cls(len(positions) - 1, len(bodies), dt)
+        store.positions[:] = positions
+        store.count = len(positions)
+        return store
+
+    @property
+    def times(self):
+        return np.arange(self.count) * self.sample_dt
+
+    def record(self, step, pos):
+        '''
+        Store the (N, 2) positions after `step` steps, if the step falls on the recording stride
+        '''
+        if step % self.stride == 0:
+            self.positions[step // self.stride] = pos
+            self.count = step // self.stride + 1
+
+    def body(self, index):
+        '''
+        Zero-copy view of the recorded positions of one body
+        '''
+        return self.positions[:self.count, index]
+
+    def relative_to(self, index):
+        '''
+        Recorded positions of every body relative to one body (e.g. the sun), shape (records, N, 2)
+        '''
+        recorded = self.positions[:self.count]
+        return recorded - recorded[:, index:index + 1]
+
+    def flush(self):
+        if isinstance(self.positions, np.memmap):
+            self.positions.flush()
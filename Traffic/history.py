@@ -0,0 +1,129 @@
+import json
+import numpy as np
+from road import popcount, unpack
+
+class RunStats:
+    '''
+    Running totals of a run, updated once per step, so the average speed and flow need no history of the road
+    '''
+    def __init__(self, length, num_cars):
+        self.length = length
+        self.num_cars = num_cars
+        self.steps = 0
+        self.total_moves = 0
+        self.last_moves = 0
+
+    def update(self, moves):
+        self.steps += 1
+        self.total_moves += moves
+        self.last_moves = moves
+
+    @property
+    def speed(self):
+        '''
+        Moves per car in the last step
+        '''
+        return self.last_moves / self.num_cars if self.num_cars > 0 else 0
+
+    @property
+    def flow(self):
+        '''
+        Cars moving per cell in the last step
+        '''
+        return self.last_moves / self.length
+
+    @property
+    def mean_speed(self):
+        return self.total_moves / (self.steps * self.num_cars) if self.steps and self.num_cars > 0 else 0
+
+    @property
+    def mean_flow(self):
+        return self.total_moves / (self.steps * self.length) if self.steps else 0
+
+class RoadHistory:
+    '''
+    The road every `stride` steps, one bit per cell in uint64 words (a row per recorded step), in memory or, with a
+    path, in a .npy file memory-mapped from disk, so long runs on long roads need almost no RAM. The length and
+    stride are saved next to the file, in path + '.json', for RoadHistory.load.
+    '''
+    def __init__(self, length, rows, stride=1, path=None):
+        self.length = length
+        self.stride = stride
+        self.path = path
+        self.count = 0 #rows recorded so far
+        shape = (rows, -(-length // 64))
+        if path is None:
+            self.words = np.empty(shape, dtype='<u8')
+        else:
+            self.words = np.lib.format.open_memmap(path, mode='w+', dtype='<u8', shape=shape)
+            with open(path + '.json', 'w') as f:
+                json.dump({'length': length, 'stride': stride}, f)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        A history saved at path, memory-mapped read only
+        '''
+        with open(path + '.json') as f:
+            layout = json.load(f)
+        history = cls.__new__(cls)
+        history.length, history.stride, history.path = layout['length'], layout['stride'], path
+        history.words = np.load(path, mmap_mode='r')
+        history.count = len(history.words)
+        return history
+
+    def append(self, words):
+        self.words[self.count] = words
+        self.count += 1
+
+    def flush(self):
+        if isinstance(self.words, np.memmap):
+            self.words.flush()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def steps(self):
+        '''
+        The step after which each row was recorded
+        '''
+        return np.arange(1, self.count + 1) * self.stride
+
+    def states(self, start=0, stop=None):
+        '''
+        Rows start to stop as a boolean (rows, cells) array
+        '''
+        stop = self.count if stop is None else min(stop, self.count)
+        return unpack(self.words[start:stop], self.length)
+
+    def space_time(self, max_rows=1000, max_columns=1000, chunk_bytes=64 * 2**20):
+        '''
+        The space-time diagram downsampled to at most max_rows x max_columns: the fraction of occupied cells in
+        each block of rows and cells. The history is read chunk_bytes at a time, and when the blocks are a word
+        wide or more the cars are counted by popcount without unpacking the words.
+        '''
+        rows, n_words = self.count, self.words.shape[1]
+        row_factor = max(1, -(-rows // max_rows))
+        out_rows = -(-rows // row_factor)
+        if self.length > 64 * max_columns:
+            #whole words per block, padded with empty words
+            unit, units, factor = 64, n_words, -(-n_words // max_columns)
+        else:
+            unit, units, factor = 1, self.length, -(-self.length // max_columns)
+        columns = -(-units // factor)
+        counts = np.zeros((out_rows, columns), dtype=np.int64)
+        row_bytes = n_words * 8 if unit == 64 else self.length #unpacked rows take a byte per cell
+        step = max(1, chunk_bytes // (row_bytes * row_factor)) * row_factor
+        for first in range(0, rows, step):
+            block = self.words[first:min(first + step, rows)]
+            cells = block if unit == 64 else unpack(block, self.length)
+            padded = np.zeros((-(-len(block) // row_factor) * row_factor, columns * factor), dtype=cells.dtype)
+            padded[:len(block), :units] = cells
+            padded = padded.reshape(-1, row_factor, columns, factor)
+            summed = popcount(padded, axis=(1, 3)) if unit == 64 else padded.sum(axis=(1, 3))
+            counts[first // row_factor:first // row_factor + len(summed)] += summed
+        #the last block of rows and of cells can be partial
+        rows_in = np.minimum(row_factor, rows - np.arange(out_rows) * row_factor)
+        cells_in = np.minimum(factor * unit, self.length - np.arange(columns) * factor * unit)
+        return counts / (rows_in[:, np.newaxis] * cells_in[np.newaxis, :])
@@ -0,0 +1,135 @@
+import numpy as np
+
+ONE = np.uint64(1)
+
+def popcount(words, axis=None):
+    '''
+    Number of set bits in an array of uint64 words, in total or along an axis
+    '''
+    if hasattr(np, 'bitwise_count'): #numpy 2.0 and later
+        counts = np.bitwise_count(words)
+    else:
+        counts = np.unpackbits(np.ascontiguousarray(words).view(np.uint8)).reshape(words.shape + (64,)).sum(axis=-1)
+    return counts.sum(axis=axis, dtype=np.int64)
+
+def pack(cells):
+    '''
+    Pack a road of 1s and 0s (the last axis) into uint64 words, cell i being bit i % 64 of word i // 64
+    '''
+    cells = np.asarray(cells, dtype=bool)
+    length = cells.shape[-1]
+    padded = np.zeros(cells.shape[:-1] + (-(-length // 64) * 64,), dtype=bool)
+    padded[..., :length] = cells
+    return np.packbits(padded, axis=-1, bitorder='little').view('<u8')
+
+def unpack(words, length):
+    '''
+    The road of a packed array as a boolean array of `length` cells
+    '''
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=-1, bitorder='little')[..., :length].astype(bool)
+
+def step_cells(cells):
+    '''
+    One step of rule 184 on a boolean road (the last axis, which wraps around): a car moves forward if the cell ahead
+    is empty. Returns the new road and the number of cars that moved.
+    '''
+    ahead = np.roll(cells, -1, axis=-1)
+    behind = np.roll(cells, 1, axis=-1)
+    moving = cells & ~ahead
+    return (cells & ahead) | (behind & ~cells), moving.sum(axis=-1)
+
+def step_packed(words, length):
+    '''
+    One step of rule 184 on a packed road of `length` cells (the last axis), with whole-array shifts: a cell is
+    occupied next if its car is blocked by the one ahead, or if it is empty and the cell behind has a car. Returns
+    the new words and the number of cars that moved, counted with a popcount.
+    '''
+    last_word, last_bit = divmod(length - 1, 64)
+    cells_mask = np.uint64((1 << (last_bit + 1)) - 1) #the bits of the last word that are cells
+    last_bit = np.uint64(last_bit)
+    #ahead[i] is cell i + 1 and behind[i] cell i - 1, carrying bits across words and around the end of the road
+    ahead = words >> ONE
+    ahead[..., :-1] |= words[..., 1:] << np.uint64(63)
+    ahead[..., last_word] = (ahead[..., last_word] & ~(ONE << last_bit)) | ((words[..., 0] & ONE) << last_bit)
+    behind = words << ONE
+    behind[..., 1:] |= words[..., :-1] >> np.uint64(63)
+    behind[..., 0] = (behind[..., 0] & ~ONE) | ((words[..., last_word] >> last_bit) & ONE)
+
+    moves = popcount(words & ~ahead, axis=-1)
+    new = (words & ahead) | (behind & ~words)
+    new[..., last_word] &= cells_mask #clear the padding
+    return new, moves
+
+class PackedRoad:
+    '''
+    A circular road stored one bit per cell in uint64 words, for roads far too long for a list of 1s and 0s. Each
+    step works through the words in chunks of chunk_words, small enough to stay in the CPU cache, writing into
+    buffers allocated once.
+    '''
+    def __init__(self, cells, chunk_words=1 << 14):
+        cells = np.asarray(cells, dtype=bool)
+        self.length = len(cells)
+        self.words = pack(cells)
+        self.chunk_words = chunk_words
+        self._moving = np.empty_like(self.words)
+        self._next = np.empty_like(self.words)
+
+    @classmethod
+    def random(cls, length, num_cars, seed=None):
+        '''
+        A road with num_cars cars at random cells
+        '''
+        rng = np.random.default_rng(seed)
+        cells = np.zeros(length, dtype=bool)
+        cells[rng.choice(length, num_cars, replace=False)] = True
+        return cls(cells)
+
+    @property
+    def cells(self):
+        return unpack(self.words, self.length)
+
+    @property
+    def num_cars(self):
+        return int(popcount(self.words))
+
+    def step(self):
+        '''
+        Advance the road by one step, returning the number of cars that moved. The same update as step_packed,
+        written as new = road ^ moving ^ arrivals, where the arrivals are the moving cars shifted forward a cell.
+        '''
+        words, moving, new = self.words, self._moving, self._next
+        n, chunk = len(words), self.chunk_words
+        last_word, last_bit = divmod(self.length - 1, 64)
+        cells_mask = np.uint64((1 << (last_bit + 1)) - 1)
+        last_bit = np.uint64(last_bit)
+        moves = 0
+        #first the cars that move: those whose cell ahead (cell i + 1, wrapping around the road) is empty
+        for first in range(0, n, chunk):
+            last = min(first + chunk, n)
+            ahead = moving[first:last]
+            np.right_shift(words[first:last], ONE, out=ahead)
+            ahead[:last - first - (last == n)] |= words[first + 1:last + (last < n)] << np.uint64(63)
+            if last == n:
+                ahead[-1] = (ahead[-1] & ~(ONE << last_bit)) | ((words[0] & ONE) << last_bit)
+            np.invert(ahead, out=ahead)
+            ahead &= words[first:last]
+            moves += int(popcount(ahead))
+        #then the cells they arrive in, one cell forward
+        for first in range(0, n, chunk):
+            last = min(first + chunk, n)
+            arrivals = new[first:last]
+            np.left_shift(moving[first:last], ONE, out=arrivals)
+            arrivals[(first == 0):] |= moving[max(first - 1, 0):last - 1] >> np.uint64(63)
+            if first == 0:
+                arrivals[0] = (arrivals[0] & ~ONE) | ((moving[last_word] >> last_bit) & ONE)
+            arrivals ^= moving[first:last]
+            arrivals ^= words[first:last]
+        new[last_word] &= cells_mask #clear the padding
+        self.words, self._next = new, words
+        return moves
+
+    def run(self, iterations):
+        '''
+        Advance the road by `iterations` steps, returning the number of cars that moved at each
+        '''
+        return np.array([self.step() for _ in range(iterations)], dtype=np.int64)
@@ -0,0 +1,90 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+from road import pack, popcount, step_packed
+
+@dataclass
+class FundamentalDiagram:
+    '''
+    Steady-state flow and speed of a road of `length` cells at every density, for each random seed (the columns)
+    '''
+    length: int
+    density: np.ndarray # (densities,) fraction of the cells with a car
+    flow: np.ndarray # (densities, seeds) cars moving per cell per timestep
+    speed: np.ndarray # (densities, seeds) moves per car per timestep, 0 for an empty road
+    steps: np.ndarray # (densities, seeds) timesteps taken to reach the steady state, or max_iterations
+    steady: np.ndarray # (densities, seeds) whether the steady state was reached within max_iterations
+
+    @property
+    def mean_flow(self):
+        return self.flow.mean(axis=1)
+
+    @property
+    def mean_speed(self):
+        return self.speed.mean(axis=1)
+
+def random_roads(length, num_cars, rng):
+    '''
+    One road of `length` cells per entry of num_cars, with that many cars at random cells, as a boolean array
+    '''
+    roads = np.zeros((len(num_cars), length), dtype=bool)
+    for road, cars in zip(roads, num_cars):
+        road[rng.choice(length, cars, replace=False)] = True
+    return roads
+
+def run_to_steady_state(words, length, max_iterations):
+    '''
+    Advance every packed road (the rows of words) together until it reaches its steady state, or for
+    max_iterations steps. A road is steady once every car moves (or, above half density, every gap does), as it
+    stays so from then on, or once its state repeats the state at its last power-of-two step. Steady roads are
+    dropped from the batch, so they cost nothing more. Returns the cars that moved in the last step of each road,
+    the steps taken, and whether each reached the steady state.
+    '''
+    rows = len(words)
+    num_cars = popcount(words, axis=-1)
+    most = np.minimum(num_cars, length - num_cars) #moves per step in free flow
+    moves = np.zeros(rows, dtype=np.int64)
+    steps = np.full(rows, max_iterations, dtype=np.int64)
+    steady = np.zeros(rows, dtype=bool)
+    active = np.arange(rows)
+    saved = words.copy()
+    for t in range(1, max_iterations + 1):
+        if not len(active):
+            break
+        words, moved = step_packed(words, length)
+        moves[active] = moved
+        done = (moved == most[active]) | (words == saved).all(axis=-1)
+        if t & (t - 1) == 0:
+            saved = words.copy()
+        if done.any():
+            steps[active[done]] = t
+            steady[active[done]] = True
+            keep = ~done
+            active, words, saved = active[keep], words[keep], saved[keep]
+    return moves, steps, steady
+
+def sweep(length, densities=None, seeds=1, max_iterations=None, processes=1, seed=None):
+    '''
+    The fundamental diagram of a road of `length` cells: every density (by default 1/length, 2/length, ..., 1) is
+    run from `seeds` random starting roads, all advanced together as one packed (road x cell) array until each is
+    steady. With processes > 1 the roads are split across a pool of processes. max_iterations defaults to the
+    length of the road, by which time any road has settled.
+    '''
+    densities = np.arange(1, length + 1) / length if densities is None else np.asarray(densities, dtype=float)
+    max_iterations = length if max_iterations is None else max_iterations
+    rng = np.random.default_rng(seed)
+    num_cars = np.repeat(np.round(densities * length).astype(int), seeds)
+    words = pack(random_roads(length, num_cars, rng))
+
+    if processes == 1:
+        moves, steps, steady = run_to_steady_state(words, length, max_iterations)
+    else:
+        batches = np.array_split(np.arange(len(words)), processes * 4)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(run_to_steady_state, words[batch], length, max_iterations) for batch in batches]
+            moves, steps, steady = (np.concatenate(parts) for parts in zip(*(future.result() for future in futures)))
+
+    shape = (len(densities), seeds)
+    speed = np.divide(moves, num_cars, out=np.zeros(len(moves)), where=num_cars > 0)
+    return FundamentalDiagram(length, densities, (moves / length).reshape(shape), speed.reshape(shape),
+                              steps.reshape(shape), steady.reshape(shape))
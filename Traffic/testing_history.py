@@ -0,0 +1,76 @@
+import os
+import tempfile
+import time
+import numpy as np
+from history import RoadHistory
+from road import pack
+from traffic import Traffic
+
+def block_means(cells, row_factor, column_factor):
+    '''
+    Fraction of occupied cells in each block of rows and cells, computed block by block
+    '''
+    return np.array([[cells[r:r + row_factor, c:c + column_factor].mean()
+                      for c in range(0, cells.shape[1], column_factor)]
+                     for r in range(0, len(cells), row_factor)])
+
+def test_histories():
+    '''
+    The packed and memmap histories hold every stride-th state of the list engine, and the run statistics match
+    its average speeds
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        for length, iterations, stride in ((100, 57, 1), (130, 200, 7), (64, 10, 3)):
+            sim = Traffic(length, 0.4, iterations)
+            states, speeds = sim.update_road(engine='list')
+            expected = np.array(states, dtype=bool)[stride - 1::stride]
+
+            packed, stats = sim.run('packed', stride)
+            assert np.array_equal(packed.states(), expected)
+            assert np.array_equal(packed.steps, np.arange(1, len(expected) + 1) * stride)
+            assert stats.speed == speeds[-1] and np.isclose(stats.mean_speed, np.mean(speeds), rtol=1e-12)
+
+            path = os.path.join(directory, f'{length}.npy')
+            sim.run('memmap', stride, path)
+            loaded = RoadHistory.load(path)
+            assert np.array_equal(loaded.states(), expected) and loaded.stride == stride
+            del loaded
+    print("packed and memmap histories match the list engine")
+
+def test_space_time():
+    '''
+    The downsampled space-time diagram is the mean of each block, whether the blocks are narrower than a word
+    (unpacked) or whole words (popcount), however the history is split into chunks
+    '''
+    rng = np.random.default_rng(0)
+    for length, max_rows, max_columns in ((130, 1000, 1000), (130, 5, 9), (130, 3, 1), (64 * 40, 7, 8)):
+        cells = rng.random((50, length)) < 0.3
+        history = RoadHistory(length, len(cells))
+        for row in pack(cells):
+            history.append(row)
+        for chunk_bytes in (1, 2000, 64 * 2**20):
+            image = history.space_time(max_rows, max_columns, chunk_bytes)
+            row_factor = -(-len(cells) // max_rows)
+            column_factor = -(-length // max_columns)
+            if length > 64 * max_columns: # Blocks of whole words
+                n_words = -(-length // 64)
+                column_factor = -(-n_words // max_columns) * 64
+            assert np.allclose(image, block_means(cells, row_factor, column_factor))
+    print("space_time matches explicit block means")
+
+def main():
+    test_histories()
+    test_space_time()
+    with tempfile.TemporaryDirectory() as directory:
+        sim = Traffic(10**6, 0.3, 2000)
+        start = time.perf_counter()
+        history, stats = sim.run('memmap', 10, os.path.join(directory, 'road.npy'))
+        print(f"10^6 cells, 2000 steps into a memmap history: {time.perf_counter() - start:.2f} s, "
+              f"mean flow {stats.mean_flow:.3f}")
+        start = time.perf_counter()
+        image = history.space_time()
+        print(f"{image.shape[0]} x {image.shape[1]} space-time diagram: {time.perf_counter() - start:.3f} s")
+        del history
+
+if __name__ == '__main__':
+    main()
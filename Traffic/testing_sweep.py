@@ -0,0 +1,51 @@
+import time
+import numpy as np
+from road import pack, step_cells
+from sweep import random_roads, run_to_steady_state, sweep
+
+def test_steady_state():
+    '''
+    Roads stopped at their detected steady state move as many cars as the same roads run for the full length of
+    the road, the longest any road takes to settle
+    '''
+    for length in (37, 64, 100, 130):
+        rng = np.random.default_rng(length)
+        num_cars = np.repeat(np.arange(length + 1), 3)
+        roads = random_roads(length, num_cars, rng)
+        moves, steps, steady = run_to_steady_state(pack(roads), length, length)
+        for _ in range(length):
+            roads, full_moves = step_cells(roads)
+        assert steady.all() and np.array_equal(moves, full_moves), length
+        print(f"length {length}: every road steady after at most {steps.max()} of {length} steps, same moves as a full run")
+
+def test_processes():
+    '''
+    Splitting the roads across processes gives the same diagram as one process
+    '''
+    serial = sweep(200, seeds=3, seed=1)
+    pooled = sweep(200, seeds=3, seed=1, processes=2)
+    for name in ('flow', 'speed', 'steps', 'steady'):
+        assert np.array_equal(getattr(serial, name), getattr(pooled, name)), name
+    print("serial and pooled sweeps are identical")
+
+def test_fundamental_diagram():
+    '''
+    In the steady state of rule 184 the flow is min(density, 1 - density)
+    '''
+    diagram = sweep(500, seeds=2, seed=2)
+    expected = np.minimum(diagram.density, 1 - diagram.density)
+    assert diagram.steady.all()
+    assert np.allclose(diagram.flow, expected[:, np.newaxis], rtol=0, atol=1e-12)
+    print("flow = min(density, 1 - density) at every density")
+
+def main():
+    test_steady_state()
+    test_processes()
+    test_fundamental_diagram()
+    for length in (1000, 4000):
+        start = time.perf_counter()
+        sweep(length, seed=0)
+        print(f"sweep of every density on a road of {length} cells: {time.perf_counter() - start:.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,8 @@
 import random
-import matplotlib.pyplot as plt
 import numpy as np
-
-N = int(input('length of road: '))
-ITERATIONS = int(input('iterations: '))
-CARDENSITY = float(input('car density: '))#as a decimal
+from history import RoadHistory, RunStats
+from road import PackedRoad
+from sweep import sweep
 
 class Traffic:
     def __init__(self, length, density, iterations):
@@ -25,10 +23,16 @@ class Traffic:
             self.road[i] = 1 #randomly change certain zeros to one by generating a set of indexes
     
   
-    def update_road(self):
+    def update_road(self, engine='list'):
         '''
-        Runs the road moving process and updates the road
+        Runs the road moving process and updates the road. engine='packed' runs the same process on a bit-packed
+        copy of the road with whole-array shifts (see road.PackedRoad), giving identical states as the rows of a
+        uint8 array
         '''
+        if engine == 'packed':
+            return self.update_packed()
+        if engine != 'list':
+            raise ValueError(f"Unknown engine '{engine}', expected 'list' or 'packed'")
         road = self.road[:]
         states = [] #all the roads, so i can plot them 
         average_speeds = []
@@ -62,39 +66,86 @@ class Traffic:
 
         return states, average_speeds
 
-    
+    def update_packed(self):
+        '''
+        update_road on a bit-packed road: every cell moves at once, and the cars that moved are counted by popcount
+        '''
+        road = PackedRoad(self.road)
+        states = np.empty((self.iterations, self.length), dtype=np.uint8)
+        average_speeds = []
+        for t in range(self.iterations):
+            moves_this_timestep = road.step()
+            states[t] = road.cells
+            average_speeds.append(moves_this_timestep / self.num_cars if self.num_cars > 0 else 0)
+        return states, average_speeds
 
-def plot_road(states):   
+    def run(self, history='none', stride=1, path=None):
+        '''
+        Runs the road moving process on a bit-packed road without keeping a list of every road. history is 'none'
+        (statistics only), 'packed' (the road every stride steps, one bit per cell, in memory) or 'memmap' (the same
+        in a .npy file at path). Returns the RoadHistory, or None, and the RunStats of the run
+        '''
+        if history not in ('none', 'packed', 'memmap'):
+            raise ValueError(f"Unknown history '{history}', expected 'none', 'packed' or 'memmap'")
+        if history == 'memmap' and path is None:
+            raise ValueError("A memmap history needs a path")
+        road = PackedRoad(self.road)
+        record = None
+        if history != 'none':
+            record = RoadHistory(self.length, self.iterations // stride, stride, path if history == 'memmap' else None)
+        stats = RunStats(self.length, self.num_cars)
+        for t in range(1, self.iterations + 1):
+            stats.update(road.step())
+            if record is not None and t % stride == 0:
+                record.append(road.words)
+        if record is not None:
+            record.flush()
+        return record, stats
+
+
+def plot_road(states, max_rows=1000, max_columns=1000):
     '''
-    Graphically representing the cars
+    Graphically representing the cars. A RoadHistory is downsampled to at most max_rows x max_columns, each pixel
+    the fraction of its cells with a car
     '''
-    road_array = np.array(states)
+    import matplotlib.pyplot as plt
+
+    if isinstance(states, RoadHistory):
+        road_array = states.space_time(max_rows, max_columns)
+    else:
+        road_array = np.array(states)
     fig, ax = plt.subplots(figsize=(5, 6))
     cax = ax.imshow(road_array, cmap='Blues', vmin=0, vmax=1, aspect='auto', origin='lower')
     ax.set_xlabel('cell')
     ax.set_ylabel('timestep')
     plt.show()
 
-def steady_state(N):
+def steady_state(N, seeds=1, processes=1):
         '''
-        Plotting the steady state speed against the number of cars on the road for a fixed length road
+        Plotting the steady state flow and speed against the density of cars for a fixed length road (the fundamental
+        diagram). Every density from 1/N to 1 is run at once by sweep.sweep, averaged over `seeds` random roads, with
+        each road stopped as soon as it is steady
         '''
-        steady_speeds = []
-        for i in range(1, N+1):
-            sim = Traffic(N, i/N, N)
-            _, average_speeds = sim.update_road() 
-            steady_speeds.append(average_speeds[-1]) #taking the last speed after running the update_road algorithm N times
-        
+        import matplotlib.pyplot as plt
+
+        diagram = sweep(N, seeds=seeds, processes=processes)
+
         #Creating the plot
-        x = np.arange(N)
-        y = np.array(steady_speeds)
-        plt.title('Steady State Speed against Number of Cars on Road')
-        plt.xlabel('Number of Cars on Road')
-        plt.ylabel('Steady State Speed')
-        plt.plot(x,y)
+        fig, (ax_flow, ax_speed) = plt.subplots(2, 1, sharex=True)
+        ax_flow.set_title('Fundamental Diagram')
+        ax_flow.plot(diagram.density, diagram.mean_flow)
+        ax_flow.set_ylabel('Steady State Flow')
+        ax_speed.plot(diagram.density, diagram.mean_speed)
+        ax_speed.set_xlabel('Car Density')
+        ax_speed.set_ylabel('Steady State Speed')
         plt.show()
+        return diagram
 
 if __name__ == '__main__':
+    N = int(input('length of road: '))
+    ITERATIONS = int(input('iterations: '))
+    CARDENSITY = float(input('car density: '))#as a decimal
+
     simulation = Traffic(N, CARDENSITY, ITERATIONS) #takes user input
     states, average_speeds = simulation.update_road()
 